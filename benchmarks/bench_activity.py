@@ -0,0 +1,98 @@
+"""Benchmark Activity: memory per object and parse throughput.
+
+Compares the slotted, lazily parsed Activity against an eager dataclass that
+copies every field and parses timestamps with strptime, the way Activity was
+built before.
+
+    python benchmarks/bench_activity.py [--count 100000]
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from dataclasses import field, make_dataclass
+from datetime import datetime, timedelta
+
+import pytz
+
+from harness import create_bench_app, use_temp_database
+
+use_temp_database()
+
+from models.activity import Activity, FIELD_DEFAULTS, REQUIRED_FIELDS  # noqa: E402
+from services.clubs import get_club_matcher  # noqa: E402
+
+app = create_bench_app()
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       'fixtures', 'webhook', 'activity_11234567890.json')
+
+EagerActivity = make_dataclass('EagerActivity', [
+    *REQUIRED_FIELDS,
+    *((name, object, field(default=None)) for name in FIELD_DEFAULTS),
+    ('club_name', object, field(default=None)),
+])
+
+
+def eager_from_strava_json(data):
+    values = {name: data[name] for name in REQUIRED_FIELDS}
+    values.update({name: data.get(name, default) for name, default in FIELD_DEFAULTS.items()})
+    for key in ('start_date', 'start_date_local'):
+        values[key] = pytz.UTC.localize(datetime.strptime(values[key], '%Y-%m-%dT%H:%M:%SZ'))
+    activity = EagerActivity(**values)
+    lat, lng = activity.start_latlng or (None, None)
+    activity.club_name = get_club_matcher().match(
+        activity.start_date_local, activity.location_city, activity.location_country, lat, lng
+    )
+    return activity
+
+
+def make_payloads(count):
+    with open(FIXTURE) as f:
+        template = json.load(f)
+    start = datetime(2024, 1, 1, 7, 0)
+    payloads = []
+    for i in range(count):
+        date = (start + timedelta(hours=13 * i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        payloads.append(dict(template, id=i + 1, start_date=date, start_date_local=date))
+    return payloads
+
+
+def build_all(build, payloads):
+    activities = [build(data) for data in payloads]
+    # What store_runs reads from every activity
+    for activity in activities:
+        activity.id, activity.name, activity.distance, activity.moving_time, activity.start_date
+    return activities
+
+
+def measure(build, payloads):
+    started = time.perf_counter()
+    build_all(build, payloads)
+    seconds = time.perf_counter() - started
+
+    # Separate pass: tracemalloc slows allocation down too much to time under it
+    tracemalloc.start()
+    activities = build_all(build, payloads)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, current / len(activities)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.count)
+    with app.app_context():
+        get_club_matcher()
+        print(f"{'model':<8} {'count':>7} {'seconds':>9} {'per sec':>10} {'bytes/obj':>10}")
+        for name, build in (('eager', eager_from_strava_json), ('lazy', Activity.from_strava_json)):
+            seconds, per_object = measure(build, payloads)
+            print(f"{name:<8} {args.count:>7} {seconds:>9.3f} {args.count / seconds:>10.0f} {per_object:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark club classification with many clubs.
+
+Scatters --clubs geofenced clubs over the Netherlands and classifies --runs
+runs, half of them started near a club at its meeting time. Compares the
+grid-indexed ClubMatcher with checking every club that meets on the run's
+weekday, and checks both give the same answers.
+
+    python benchmarks/bench_clubs.py [--clubs 500] [--runs 100000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from harness import ROOT  # noqa: F401  (puts the project on sys.path)
+
+from services.clubs import WEEKDAYS, ClubMatcher  # noqa: E402
+
+
+def make_clubs(count, rng):
+    clubs = {}
+    for k in range(count):
+        hour = rng.randrange(6, 20)
+        clubs[f'Club {k}'] = {
+            'days': rng.sample(WEEKDAYS, rng.randrange(1, 3)),
+            'time_window': {'start': f'{hour:02d}:00', 'end': f'{hour + 1:02d}:30'},
+            'location_city': f'City {k % 40}',
+            'location_country': 'Netherlands',
+            'start_latlng': [rng.uniform(51.3, 53.3), rng.uniform(3.6, 7.0)],
+            'radius_m': rng.uniform(500, 3000),
+        }
+    return clubs
+
+
+def make_runs(clubs, count, rng):
+    configs = list(clubs.values())
+    first = datetime(2024, 1, 1)
+    runs = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            club = rng.choice(configs)
+            day = first + timedelta(days=rng.randrange(366))
+            day += timedelta(days=(WEEKDAYS.index(club['days'][0]) - day.weekday()) % 7)
+            start = day.replace(hour=int(club['time_window']['start'][:2]), minute=rng.randrange(60))
+            lat = club['start_latlng'][0] + rng.uniform(-0.01, 0.01)
+            lng = club['start_latlng'][1] + rng.uniform(-0.01, 0.01)
+            city = club['location_city']
+        else:
+            start = first + timedelta(minutes=rng.randrange(366 * 24 * 60))
+            lat, lng = rng.uniform(51.3, 53.3), rng.uniform(3.6, 7.0)
+            city = f'City {rng.randrange(40)}'
+        runs.append((start, city, 'Netherlands', lat, lng))
+    return runs
+
+
+def scan_classify(matcher, runs):
+    """Every club meeting that weekday, as before the grid index"""
+    names = []
+    for start, city, country, lat, lng in runs:
+        run_time = start.time()
+        names.append(next((rule.name for rule in matcher._rules_by_weekday[start.weekday()]
+                           if rule.matches(run_time, city, country, lat, lng)), None))
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clubs', type=int, default=500)
+    parser.add_argument('--runs', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    clubs = make_clubs(args.clubs, rng)
+    runs = make_runs(clubs, args.runs, rng)
+
+    started = time.perf_counter()
+    matcher = ClubMatcher(clubs)
+    build = time.perf_counter() - started
+
+    results = {}
+    print(f"{'path':<6} {'seconds':>9} {'runs/sec':>10} {'club runs':>10}")
+    for name, classify in (('scan', lambda: scan_classify(matcher, runs)), ('grid', lambda: matcher.classify(runs))):
+        started = time.perf_counter()
+        results[name] = classify()
+        seconds = time.perf_counter() - started
+        matched = sum(1 for club in results[name] if club)
+        print(f"{name:<6} {seconds:>9.3f} {args.runs / seconds:>10.0f} {matched:>10}")
+    print(f"grid built in {build * 1000:.1f} ms; results {'match' if results['scan'] == results['grid'] else 'DIFFER'}")
+
+
+if __name__ == '__main__':
+    main()
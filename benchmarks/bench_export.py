@@ -0,0 +1,104 @@
+"""Benchmark the streaming run export against building the file in memory.
+
+Stores --runs synthetic runs for one user, then downloads /export/runs.csv and
+/export/runs.ndjson through the test client, reporting time to the first
+chunk, total time and peak Python memory. The in-memory baseline loads every
+Run with .all() and joins the whole CSV before answering.
+
+    python benchmarks/bench_export.py [--runs 50000]
+"""
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+from datetime import datetime
+
+from harness import SyntheticData, create_bench_app, use_temp_database
+
+use_temp_database()
+
+from models import db  # noqa: E402
+from models.run import Run  # noqa: E402
+from services import export  # noqa: E402
+from services.sync import store_runs  # noqa: E402
+from models.user import User  # noqa: E402
+
+app = create_bench_app()
+
+
+def seed(runs):
+    data = SyntheticData(users=1, runs=runs, clubs=1)
+    athlete = data.athlete(0)
+    user = User(strava_id=str(athlete['id']), name=f"{athlete['firstname']} {athlete['lastname']}",
+                access_token='bench', refresh_token='bench', token_expires_at=datetime(2100, 1, 1))
+    db.session.add(user)
+    db.session.commit()
+    store_runs(user, data.activities(0))
+    return user.id
+
+
+def download(client, path):
+    """(seconds to first chunk, total seconds, bytes)"""
+    started = time.perf_counter()
+    response = client.get(path, buffered=False)
+    first = None
+    size = 0
+    for chunk in response.response:
+        if first is None:
+            first = time.perf_counter() - started
+        size += len(chunk)
+    response.close()
+    return first, time.perf_counter() - started, size
+
+
+def in_memory_csv(user_id):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for run in Run.query.filter_by(user_id=user_id).order_by(Run.start_date).all():
+        writer.writerow([getattr(run, column.key) for column in export.USER_COLUMNS])
+    return buffer.getvalue().encode()
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=50000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        user_id = seed(args.runs)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['access_token'] = 'bench'
+        session['user_id'] = user_id
+
+    def baseline():
+        with app.app_context():
+            body = in_memory_csv(user_id)
+            db.session.remove()
+        return body
+
+    paths = {'csv': '/export/runs.csv', 'ndjson': '/export/runs.ndjson'}
+    print(f"{'path':<10} {'first byte':>11} {'seconds':>9} {'MB':>8} {'peak MB':>9}")
+    for name, path in paths.items():
+        # Separate passes: tracemalloc slows allocation-heavy code down
+        first, total, size = download(client, path)
+        peak = peak_memory(lambda: download(client, path))
+        print(f"{name:<10} {first:>11.4f} {total:>9.3f} {size / 1e6:>8.1f} {peak / 1e6:>9.1f}")
+    started = time.perf_counter()
+    size = len(baseline())
+    total = time.perf_counter() - started
+    peak = peak_memory(baseline)
+    print(f"{'in-memory':<10} {total:>11.4f} {total:>9.3f} {size / 1e6:>8.1f} {peak / 1e6:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Compare storing raw Strava payloads as JSON text in the run table with
+zlib-compressed blobs in run_payload.
+
+Writes the same --runs synthetic runs into two SQLite files, one with the
+old ``run.raw_json`` text column and one with the current schema, and reports
+the file size after VACUUM, insert time, a full scan of the run table and
+reading single payloads back as dicts.
+
+    python benchmarks/bench_payloads.py [--runs 100000]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from harness import SyntheticData
+
+from sqlalchemy import Column, MetaData, Text, create_engine, insert, select, text  # noqa: E402
+
+from models.activity import Activity  # noqa: E402
+from models.run import Run  # noqa: E402
+from models.run_payload import RunPayload, decompress_payload, payload_json, payload_row  # noqa: E402
+from models.user import User  # noqa: E402
+
+USERS = 100
+SAMPLE = 2000  # Payloads read back one by one
+
+
+def schema(with_raw_json):
+    """(metadata, run table, payload table or None) for the old or the current layout"""
+    metadata = MetaData()
+    User.__table__.to_metadata(metadata)
+    run = Run.__table__.to_metadata(metadata)
+    if with_raw_json:
+        run.append_column(Column('raw_json', Text))
+        return metadata, run, None
+    return metadata, run, RunPayload.__table__.to_metadata(metadata)
+
+
+def run_row(user_id, act):
+    activity = Activity(act)  # Club detection is left out; it needs the app's database
+    return {'user_id': user_id, 'strava_activity_id': str(activity.id), 'name': activity.name,
+            'start_date': activity.start_date, 'start_date_local': activity.start_date_local,
+            'distance': activity.distance, 'moving_time': activity.moving_time,
+            **Run.columns_from_strava_json(act)}
+
+
+def build(path, users, with_raw_json):
+    engine = create_engine(f'sqlite:///{path}')
+    metadata, run, payload = schema(with_raw_json)
+    metadata.create_all(engine)
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        for user_id, activities in users:
+            rows = [run_row(user_id, act) for act in activities]
+            if with_raw_json:
+                for row, act in zip(rows, activities):
+                    row['raw_json'] = json.dumps(act)
+            connection.execute(insert(run), rows)
+            if payload is not None:
+                connection.execute(insert(payload), [
+                    payload_row(row['strava_activity_id'], payload_json(act))
+                    for row, act in zip(rows, activities)
+                ])
+    seconds = time.perf_counter() - started
+    with engine.connect() as connection:
+        connection.execute(text('VACUUM'))
+    return engine, run, payload, seconds
+
+
+def scan(engine, run):
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        connection.execute(select(run.c.user_id, run.c.start_date_local, run.c.distance,
+                                  run.c.moving_time, run.c.club_name)).all()
+    return time.perf_counter() - started
+
+
+def read_payloads(engine, run, payload, activity_ids):
+    if payload is None:
+        column, key, load = run.c.raw_json, run.c.strava_activity_id, json.loads
+    else:
+        column, key, load = payload.c.data, payload.c.strava_activity_id, decompress_payload
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        for activity_id in activity_ids:
+            data = load(connection.execute(select(column).where(key == activity_id)).scalar())
+            assert str(data['id']) == activity_id
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=100000)
+    args = parser.parse_args()
+
+    data = SyntheticData(users=USERS, runs=max(1, args.runs // USERS))
+    users = [(u + 1, data.activities(u)) for u in range(USERS)]
+    activity_ids = random.Random(data.seed).sample(
+        [str(act['id']) for _, activities in users for act in activities], SAMPLE)
+    directory = tempfile.mkdtemp()
+
+    results = {}
+    for name, with_raw_json in (('raw_json', True), ('compressed', False)):
+        path = os.path.join(directory, f'{name}.db')
+        engine, run, payload, write = build(path, users, with_raw_json)
+        results[name] = (os.path.getsize(path), write, scan(engine, run),
+                         read_payloads(engine, run, payload, activity_ids))
+        engine.dispose()
+
+    runs = sum(len(activities) for _, activities in users)
+    print(f"{runs} runs, SQLite, sizes after VACUUM")
+    print(f"{'layout':<11} {'MB':>7} {'bytes/run':>10} {'insert s':>9} {'scan s':>8} {'read us':>8}")
+    for name, (size, write, scanned, read) in results.items():
+        print(f"{name:<11} {size / 1e6:>7.1f} {size / runs:>10.0f} {write:>9.2f} {scanned:>8.3f} "
+              f"{read / SAMPLE * 1e6:>8.0f}")
+    before, after = results['raw_json'][0], results['compressed'][0]
+    print(f"database {100 * (1 - after / before):.0f}% smaller")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Measure web worker startup: import, app creation, first requests and memory per worker.
+
+Seeds one runner into a throwaway SQLite database, then for each way of
+starting gunicorn workers runs a fresh interpreter that forks --workers of them:
+
+    import in worker   each worker imports and builds the app after the fork (no --preload)
+    preload            the parent builds the app and the workers fork from it
+    preload + warm-up  the parent also compiles the templates, configures the mappers
+                       and freezes the garbage collector, as gunicorn.conf.py does
+
+Every worker renders the dashboard, /stats and /my-clubs twice and reports
+its boot time (fork to ready to serve), both passes and its resident and
+private memory from /proc/self/smaps_rollup, so Linux only. Private memory is
+what each extra worker really costs; pages still shared with the parent are
+not in it.
+
+    python benchmarks/bench_startup.py [--workers 4] [--runs 2000]
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    'cold': 'import in worker',
+    'preload': 'preload',
+    'warm': 'preload + warm-up',
+}
+PATHS = ('/', '/stats', '/my-clubs')
+
+
+def memory():
+    """(resident, private) MB of this process"""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return fields['Rss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+
+def build_app(timings):
+    started = time.perf_counter()
+    import app
+    timings['import'] = time.perf_counter() - started
+    started = time.perf_counter()
+    flask_app = app.create_app()
+    timings['create'] = time.perf_counter() - started
+    return flask_app
+
+
+def serve(flask_app, user_id):
+    """Seconds to render PATHS once"""
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session['access_token'] = 'bench'
+        session['user_id'] = user_id
+    started = time.perf_counter()
+    for path in PATHS:
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+    return time.perf_counter() - started
+
+
+def worker(flask_app, user_id, forked_at, out):
+    timings = {}
+    if flask_app is None:
+        flask_app = build_app(timings)
+    else:
+        from models import db
+        with flask_app.app_context():
+            db.engine.dispose(close=False)
+    timings['boot'] = time.perf_counter() - forked_at
+    timings['first'] = serve(flask_app, user_id)
+    timings['second'] = serve(flask_app, user_id)
+    timings['rss'], timings['private'] = memory()
+    os.write(out, (json.dumps(timings) + '\n').encode())
+
+
+def child(mode, workers, user_id):
+    """Build the app (unless cold), fork the workers and print one JSON line"""
+    parent = {}
+    flask_app = None
+    if mode != 'cold':
+        flask_app = build_app(parent)
+    if mode == 'warm':
+        from app import warm_up
+        started = time.perf_counter()
+        warm_up(flask_app)
+        parent['warm'] = time.perf_counter() - started
+        gc.freeze()
+
+    read, write = os.pipe()
+    pids = []
+    for _ in range(workers):
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                worker(flask_app, user_id, forked_at, write)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    os.close(write)
+    with os.fdopen(read) as lines:
+        results = [json.loads(line) for line in lines]
+    print(json.dumps({'parent': parent, 'workers': results}))
+
+
+def seed(runs):
+    from harness import SyntheticData, create_bench_app
+    from datetime import datetime
+    from models import db
+    from models.user import User
+    from services.sync import store_runs
+
+    data = SyntheticData(users=1, runs=runs, clubs=2)
+    flask_app = create_bench_app()
+    with flask_app.app_context():
+        athlete = data.athlete(0)
+        user = User(strava_id=str(athlete['id']), name=f"{athlete['firstname']} {athlete['lastname']}",
+                    access_token='bench', refresh_token='bench', token_expires_at=datetime(2100, 1, 1))
+        db.session.add(user)
+        db.session.commit()
+        store_runs(user, data.activities(0))
+        return user.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=2000)
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--user-id', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.workers, args.user_id)
+        return
+
+    from harness import use_temp_database
+    use_temp_database()
+    user_id = seed(args.runs)
+    # Each mode starts from a fresh interpreter that has imported nothing of the app
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    print(f"{args.workers} workers, {args.runs} runs; times in ms, memory per worker in MB")
+    print(f"{'mode':<18} {'import':>7} {'create':>7} {'warm-up':>8} {'boot':>7} {'1st pass':>9} "
+          f"{'2nd pass':>9} {'RSS':>6} {'private':>8}")
+    for mode, label in MODES.items():
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', mode, '--workers', str(args.workers),
+             '--user-id', str(user_id)],
+            env=env, cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        parent, workers = result['parent'], result['workers']
+
+        def ms(key):
+            value = parent.get(key)
+            if value is None and key in workers[0]:
+                value = statistics.mean(w[key] for w in workers)
+            return f"{value * 1000:.1f}" if value is not None else '-'
+
+        def mb(key):
+            return statistics.mean(w[key] for w in workers)
+
+        print(f"{label:<18} {ms('import'):>7} {ms('create'):>7} {ms('warm'):>8} {ms('boot'):>7} "
+              f"{ms('first'):>9} {ms('second'):>9} {mb('rss'):>6.1f} {mb('private'):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
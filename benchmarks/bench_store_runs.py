@@ -0,0 +1,85 @@
+"""Benchmark store_runs: SQL statement count and wall time per batch size.
+
+Compares the bulk upsert path against the previous one-SELECT-per-activity
+loop on a throwaway SQLite database.
+
+    python benchmarks/bench_store_runs.py [--sizes 1000 10000]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from harness import QueryCounter, create_bench_app, use_temp_database
+
+use_temp_database()
+
+from models import db  # noqa: E402
+from models.run import Run  # noqa: E402
+from models.user import User  # noqa: E402
+from services.sync import run_row_from_activity, store_runs  # noqa: E402
+
+app = create_bench_app()
+
+
+def make_activities(count, first_id=1):
+    start = datetime(2024, 1, 1, 7, 0)
+    activities = []
+    for i in range(count):
+        date = (start + timedelta(hours=13 * i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        activities.append({
+            'id': first_id + i, 'name': f'Run {i}', 'type': 'Run',
+            'distance': 5000.0 + i % 5000, 'moving_time': 1500 + i % 1800,
+            'elapsed_time': 1600 + i % 1800, 'total_elevation_gain': 12.0,
+            'start_date': date, 'start_date_local': date, 'timezone': '(GMT+01:00) Europe/Amsterdam',
+            'average_speed': 3.2, 'max_speed': 4.1,
+            'location_city': 'Rotterdam', 'location_country': 'Netherlands',
+        })
+    return activities
+
+
+def legacy_store_runs(user, activities):
+    """The previous implementation: one SELECT and one ORM object per activity"""
+    for act in activities:
+        if act['type'] != 'Run':
+            continue
+        row = run_row_from_activity(user, act)
+        run = Run.query.filter_by(strava_activity_id=row['strava_activity_id']).first()
+        if not run:
+            db.session.add(Run(**row))
+        else:
+            for key, value in row.items():
+                setattr(run, key, value)
+    db.session.commit()
+
+
+def measure(fn, user, activities, counter):
+    counter.count = 0
+    started = time.perf_counter()
+    fn(user, activities)
+    return counter.count, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    args = parser.parse_args()
+
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+        print(f"{'path':<8} {'size':>7} {'pass':<7} {'queries':>8} {'seconds':>9}")
+        for size in args.sizes:
+            for name, fn in (('legacy', legacy_store_runs), ('bulk', store_runs)):
+                db.drop_all()
+                db.create_all()
+                user = User(strava_id='1', name='Bench', access_token='x', refresh_token='x',
+                            token_expires_at=datetime.utcnow())
+                db.session.add(user)
+                db.session.commit()
+                activities = make_activities(size)
+                for phase in ('insert', 'update'):
+                    queries, seconds = measure(fn, user, activities, counter)
+                    print(f"{name:<8} {size:>7} {phase:<7} {queries:>8} {seconds:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
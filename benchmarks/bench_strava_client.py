@@ -0,0 +1,81 @@
+"""Exercise StravaClient against the local stub API.
+
+Checks that transient failures are retried, that the shared limiter throttles
+bursts, and compares pooled keep-alive requests with one connection per call.
+
+    python benchmarks/bench_strava_client.py [--requests 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.strava import RateLimitExceeded, SharedRateLimiter, StravaClient  # noqa: E402
+from stub_strava import StubStrava  # noqa: E402
+
+
+def limiter(short_limit=10000, window=1):
+    return SharedRateLimiter(path=os.path.join(tempfile.mkdtemp(), 'limiter.sqlite3'),
+                             short_limit=short_limit, daily_limit=10 ** 7, window=window)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    activities = [{'id': i, 'start_date': '2024-01-01T07:00:00Z'} for i in range(10)]
+    stub = StubStrava(activities, short_limit=10 ** 6, daily_limit=10 ** 7).start()
+    try:
+        client = StravaClient(base_url=stub.url, limiter=limiter(), backoff=0.01)
+
+        stub.fail_next = [503, 500, 429]
+        response = client.get_athlete('token')
+        print(f"retries: status {response.status_code} after {stub.request_count} attempts")
+        assert response.status_code == 200 and stub.request_count == 4
+
+        stub.request_count, stub.client_ports = 0, set()
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            client.list_activities('token', per_page=200)
+        pooled = time.perf_counter() - started
+        pooled_connections = len(stub.client_ports)
+
+        stub.client_ports = set()
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            requests.get(stub.url + '/api/v3/athlete/activities', params={'per_page': 200},
+                         headers={'Authorization': 'Bearer token'})
+        unpooled = time.perf_counter() - started
+        print(f"pooled:   {args.requests} requests in {pooled:.3f}s over {pooled_connections} connection(s)")
+        print(f"unpooled: {args.requests} requests in {unpooled:.3f}s over {len(stub.client_ports)} connection(s)")
+
+        # 25 calls at 10 per one-second window span three windows, so at least one full second
+        burst = 25
+        throttled = StravaClient(base_url=stub.url, limiter=limiter(short_limit=10, window=1))
+        started = time.perf_counter()
+        for _ in range(burst):
+            throttled.get_athlete('token')
+        elapsed = time.perf_counter() - started
+        print(f"limiter:  {burst} requests at 10/s took {elapsed:.2f}s (expected >= 1.0s)")
+        assert elapsed >= 1.0
+
+        stub.request_count, stub.short_limit = 0, 5
+        quota = StravaClient(base_url=stub.url, limiter=limiter())
+        try:
+            for _ in range(10):
+                quota.get_athlete('token')
+            raise AssertionError('spent quota did not stop the client')
+        except RateLimitExceeded as e:
+            print(f"quota:    stopped after {stub.request_count} requests ({e})")
+    finally:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
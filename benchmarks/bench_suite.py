@@ -0,0 +1,181 @@
+"""Benchmark the hot paths on synthetic data and compare against a baseline.
+
+Seeds N users x M runs x K clubs into a throwaway SQLite database, then times
+store_runs, group_runs_by_week, calculate_longest_streak, the run-day index
+streaks, /stats and /<club>/rank (through the Flask test client) and counts
+SQL statements for each. Exits non-zero when a path got slower than the baseline by more than
+--threshold or issues more queries than it did.
+
+    python benchmarks/bench_suite.py                    # compare with baseline.json
+    python benchmarks/bench_suite.py --update-baseline  # record a new baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from harness import QueryCounter, SyntheticData, create_bench_app, use_temp_database
+
+use_temp_database()
+
+from models import db  # noqa: E402
+from models.club import Club  # noqa: E402
+from models.run import Run  # noqa: E402
+from models.user import User  # noqa: E402
+from services.buckets import week_ranges  # noqa: E402
+from services.clubs import save_club  # noqa: E402
+from services.rundays import RunDays  # noqa: E402
+from services.sync import store_runs  # noqa: E402
+from views.runs import group_runs_by_week  # noqa: E402
+
+app = create_bench_app()
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+NOISE_FLOOR = 0.005  # Seconds; smaller differences are timer noise on tiny paths
+
+
+def calculate_longest_streak(runs):
+    """Longest streak of consecutive days from the runs themselves, as /stats did before the run-day index"""
+    longest = current = 0
+    previous = None
+    for run_date in sorted(set(r.start_date_local.date() for r in runs if r.start_date_local)):
+        current = current + 1 if previous and run_date - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = run_date
+    return longest
+
+
+def timed(fn, counter, repeat):
+    """Median wall time and the statement count of one call"""
+    timings = []
+    for _ in range(repeat):
+        counter.count = 0
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {'seconds': statistics.median(timings), 'queries': counter.count}
+
+
+def seed_users(data):
+    users = []
+    for u in range(data.users):
+        athlete = data.athlete(u)
+        user = User(strava_id=str(athlete['id']), name=f"{athlete['firstname']} {athlete['lastname']}",
+                    profile_photo='', access_token='bench', refresh_token='bench',
+                    token_expires_at=datetime(2100, 1, 1))
+        db.session.add(user)
+        users.append(user)
+    db.session.commit()
+    return users
+
+
+def run_suite(data, repeat):
+    results = {}
+    with app.app_context():
+        # Synthetic clubs replace the seeded ones for the run
+        Club.query.delete()
+        for name, club_config in data.club_configs().items():
+            save_club(name, club_config)
+        counter = QueryCounter(db.engine)
+        users = seed_users(data)
+        payloads = [data.activities(u) for u in range(data.users)]
+
+        def ingest():
+            for user, activities in zip(users, payloads):
+                store_runs(user, activities)
+
+        # First pass inserts everything; later passes re-sync unchanged data
+        results['store_runs_insert'] = timed(ingest, counter, 1)
+        results['store_runs_resync'] = timed(ingest, counter, repeat)
+
+        user = users[0]
+        runs = Run.query.filter_by(user_id=user.id).order_by(Run.start_date).all()
+        ranges = week_ranges(data.year - 1, data.year)
+        results['group_runs_by_week'] = timed(lambda: group_runs_by_week(runs, ranges), counter, repeat)
+        results['calculate_longest_streak'] = timed(lambda: calculate_longest_streak(runs), counter, repeat)
+        days = RunDays.load(user.id)
+        results['run_day_streaks'] = timed(
+            lambda: (days.longest_streak(), days.current_streak(), days.weekly_streaks()), counter, repeat)
+        user_id = user.id
+        club_slug = data.club_name(0).lower().replace(' ', '-')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['access_token'] = 'bench'
+        session['user_id'] = user_id
+
+    def get(path):
+        response = client.get(path)
+        assert response.status_code == 200, f'{path} returned {response.status_code}'
+
+    with app.app_context():
+        results['stats'] = timed(lambda: get('/stats'), counter, repeat)
+        results['club_rank'] = timed(lambda: get(f'/{club_slug}/rank'), counter, repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = result['seconds'] - base['seconds']
+        if slower > NOISE_FLOOR and result['seconds'] > base['seconds'] * (1 + threshold):
+            regressions.append(f"{name}: {result['seconds']:.4f}s vs {base['seconds']:.4f}s")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {result['queries']} queries vs {base['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=500, help='Runs per user')
+    parser.add_argument('--clubs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown, 0.25 = 25%%')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    data = SyntheticData(users=args.users, runs=args.runs, clubs=args.clubs, seed=args.seed)
+    params = {'users': data.users, 'runs': data.runs, 'clubs': data.clubs, 'seed': data.seed}
+    results = run_suite(data, args.repeat)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"{'path':<26} {'seconds':>9} {'queries':>8} {'baseline':>9}")
+    for name, result in results.items():
+        base = (baseline or {}).get('results', {}).get(name) if baseline and baseline['params'] == params else None
+        base_seconds = f"{base['seconds']:.4f}" if base else '-'
+        print(f"{name:<26} {result['seconds']:>9.4f} {result['queries']:>8} {base_seconds:>9}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'params': params, 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+    if baseline is None:
+        print('No baseline yet; run with --update-baseline to record one')
+        return 0
+    if baseline['params'] != params:
+        print(f"Baseline was recorded with {baseline['params']}; not comparing")
+        return 0
+
+    regressions = compare(results, baseline['results'], args.threshold)
+    for line in regressions:
+        print(f'REGRESSION {line}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
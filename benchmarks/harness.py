@@ -0,0 +1,168 @@
+"""Shared pieces for the benchmark scripts: a throwaway database, a SQL
+statement counter and a seeded generator of Strava activity payloads.
+
+Call ``use_temp_database()`` before importing ``app`` or any service so the
+database and cache settings take effect, then build the app with
+``create_bench_app()``.
+"""
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+POLYLINE_CHARS = ''.join(map(chr, range(63, 127)))  # Google's encoded polyline alphabet
+
+
+def use_temp_database():
+    """Point the app at a fresh SQLite file and turn the response cache off"""
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['RESPONSE_CACHE_BACKEND'] = 'none'
+    # Club saves invalidate the matcher in-process; no periodic version checks skewing query counts
+    os.environ['CLUB_RELOAD_INTERVAL'] = '3600'
+    return path
+
+
+def create_bench_app():
+    """The app with its schema in place, as ``flask db-upgrade`` leaves it on deploy"""
+    from app import create_app
+    from migrations import upgrade
+    app = create_app()
+    with app.app_context():
+        upgrade()
+    return app
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+class SyntheticData:
+    """Seeded Strava-like data for ``users`` runners across ``clubs`` clubs.
+
+    Every club meets weekly in its own city; each runner belongs to one club
+    and about a third of their ``runs`` fall inside its meeting window, the
+    rest are spread over the previous and the current year.
+    """
+
+    def __init__(self, users=20, runs=500, clubs=5, seed=42, year=None):
+        self.users = users
+        self.runs = runs
+        self.clubs = clubs
+        self.seed = seed
+        self.year = year or datetime.utcnow().year
+
+    def club_name(self, index):
+        return f'Bench Club {index + 1}'
+
+    def club_configs(self):
+        configs = {}
+        for k in range(self.clubs):
+            hour = 7 + k % 3
+            configs[self.club_name(k)] = {
+                'days': [WEEKDAYS[k % 7]],
+                'time_window': {'start': f'{hour:02d}:00', 'end': f'{hour + 2:02d}:00'},
+                'location_city': f'Benchville {k + 1}',
+                'location_country': 'Netherlands',
+                'start_latlng': [51.9 + k / 100, 4.4 + k / 100],
+                'description': f'Synthetic club {k + 1}',
+            }
+        return configs
+
+    def athlete(self, user_index):
+        return {'id': 9000000 + user_index, 'firstname': 'Runner', 'lastname': str(user_index + 1)}
+
+    def activities(self, user_index):
+        """Activity payloads for one runner, identical for the same seed"""
+        rng = random.Random(self.seed * 100003 + user_index)
+        club = user_index % self.clubs
+        config = self.club_configs()[self.club_name(club)]
+        club_weekday = WEEKDAYS.index(config['days'][0])
+        club_hour = int(config['time_window']['start'][:2])
+        first_day = datetime(self.year - 1, 1, 1)
+        span_days = (datetime(self.year + 1, 1, 1) - first_day).days
+
+        activities = []
+        for i in range(self.runs):
+            day = first_day + timedelta(days=rng.randrange(span_days))
+            if rng.random() < 0.33:
+                day += timedelta(days=(club_weekday - day.weekday()) % 7)
+                start = day.replace(hour=club_hour, minute=rng.randrange(60))
+                city = config['location_city']
+                latlng = config['start_latlng']
+            else:
+                start = day.replace(hour=rng.randrange(5, 22), minute=rng.randrange(60))
+                city = 'Benchtown'
+                latlng = [52.0 + rng.random() / 10, 4.3 + rng.random() / 10]
+            distance = round(rng.uniform(3000, 21100), 1)
+            speed = rng.uniform(2.4, 4.2)
+            moving_time = int(distance / speed)
+            local = start.strftime('%Y-%m-%dT%H:%M:%SZ')
+            utc = (start - timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            heartrate = round(rng.uniform(130, 170), 1)
+            activities.append({
+                'resource_state': 2,
+                'athlete': {'id': self.athlete(user_index)['id'], 'resource_state': 1},
+                'id': (user_index + 1) * 10_000_000 + i,
+                'name': rng.choice(('Morning Run', 'Lunch Run', 'Evening Run', 'Long Run', 'Club Run')),
+                'distance': distance,
+                'moving_time': moving_time,
+                'elapsed_time': moving_time + rng.randrange(0, 600),
+                'total_elevation_gain': round(rng.uniform(0, 80), 1),
+                'type': 'Run',
+                'sport_type': 'Run',
+                'workout_type': None,
+                'start_date': utc,
+                'start_date_local': local,
+                'timezone': '(GMT+01:00) Europe/Amsterdam',
+                'utc_offset': 3600.0,
+                'location_city': city,
+                'location_state': None,
+                'location_country': 'Netherlands',
+                'start_latlng': latlng,
+                'end_latlng': latlng,
+                'achievement_count': rng.randrange(5),
+                'kudos_count': rng.randrange(30),
+                'comment_count': rng.randrange(3),
+                'athlete_count': rng.randrange(1, 20),
+                'photo_count': 0,
+                # Random like a real encoded track, so payloads compress realistically
+                'map': {'id': f'a{i}', 'resource_state': 2,
+                        'summary_polyline': ''.join(rng.choices(POLYLINE_CHARS, k=rng.randrange(200, 1200)))},
+                'trainer': False,
+                'commute': False,
+                'manual': False,
+                'private': False,
+                'visibility': 'everyone',
+                'flagged': False,
+                'gear_id': 'g1',
+                'average_speed': round(speed, 3),
+                'max_speed': round(speed * 1.4, 3),
+                'average_cadence': round(rng.uniform(78, 92), 1),
+                'has_heartrate': True,
+                'average_heartrate': heartrate,
+                'max_heartrate': heartrate + 20,
+                'heartrate_opt_out': False,
+                'display_hide_heartrate_option': True,
+                'elev_high': 12.0,
+                'elev_low': -3.0,
+                'upload_id': (user_index + 1) * 10_000_000 + i,
+                'external_id': f'garmin_{i}.fit',
+                'from_accepted_tag': False,
+                'pr_count': rng.randrange(3),
+                'total_photo_count': 0,
+                'has_kudoed': False,
+            })
+        return activities
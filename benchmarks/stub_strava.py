@@ -0,0 +1,126 @@
+"""Local stand-in for the Strava API, for benchmarks and manual testing.
+
+Serves the OAuth token endpoint, the athlete profile, the paginated activity
+list and single activities from an in-memory list, with Strava-style rate
+limit headers. Failures can be queued to exercise retries:
+
+    stub = StubStrava(activities).start()
+    stub.fail_next = [503, 429]
+    client = StravaClient(base_url=stub.url, limiter=...)
+    ...
+    stub.stop()
+
+Run standalone with ``python benchmarks/stub_strava.py`` and point the app at
+it with ``STRAVA_URL=http://127.0.0.1:8765``.
+"""
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def epoch(value):
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').timestamp() - time.timezone
+
+
+class StubStrava:
+    def __init__(self, activities=(), athlete=None, host='127.0.0.1', port=0, latency=0.0,
+                 short_limit=600, daily_limit=30000):
+        self.activities = list(activities)
+        self.athlete = athlete or {'id': 1, 'firstname': 'Stub', 'lastname': 'Runner', 'profile': ''}
+        self.latency = latency
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.fail_next = []         # Statuses to answer the next requests with
+        self.request_count = 0
+        self.client_ports = set()   # One per TCP connection the clients opened
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def list_activities(self, query):
+        after = int(query.get('after', ['0'])[0] or 0)
+        before_value = query.get('before', [''])[0]
+        before = int(before_value) if before_value and before_value != 'None' else None
+        page = int(query.get('page', ['1'])[0])
+        per_page = int(query.get('per_page', ['30'])[0])
+        matching = [
+            activity for activity in sorted(self.activities, key=lambda a: a['start_date'])
+            if epoch(activity['start_date']) > after
+            and (before is None or epoch(activity['start_date']) < before)
+        ]
+        return matching[(page - 1) * per_page:page * per_page]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled clients reuse connections
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode()
+                with stub._lock:
+                    stub.request_count += 1
+                    usage = f'{stub.request_count},{stub.request_count}'
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('X-RateLimit-Limit', f'{stub.short_limit},{stub.daily_limit}')
+                self.send_header('X-RateLimit-Usage', usage)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _route(self):
+                stub.client_ports.add(self.client_address[1])
+                if stub.latency:
+                    time.sleep(stub.latency)
+                with stub._lock:
+                    failure = stub.fail_next.pop(0) if stub.fail_next else None
+                if failure:
+                    return self._send(failure, {'message': 'Injected failure'})
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == '/oauth/token':
+                    length = int(self.headers.get('Content-Length') or 0)
+                    self.rfile.read(length)
+                    return self._send(200, {
+                        'access_token': 'stub-access', 'refresh_token': 'stub-refresh',
+                        'expires_at': int(time.time()) + 6 * 3600, 'athlete': stub.athlete,
+                    })
+                if url.path == '/api/v3/athlete':
+                    return self._send(200, stub.athlete)
+                if url.path == '/api/v3/athlete/activities':
+                    return self._send(200, stub.list_activities(query))
+                match = re.fullmatch(r'/api/v3/activities/(\d+)', url.path)
+                if match:
+                    for activity in stub.activities:
+                        if str(activity['id']) == match.group(1):
+                            return self._send(200, activity)
+                    return self._send(404, {'message': 'Record Not Found'})
+                return self._send(404, {'message': 'Not Found'})
+
+            do_GET = do_POST = _route
+
+        return Handler
+
+
+if __name__ == '__main__':
+    server = StubStrava(port=8765)
+    print(f'Stub Strava API on {server.url}')
+    server.server.serve_forever()
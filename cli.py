@@ -0,0 +1,151 @@
+"""``flask --app app <command>``: schema management, bulk syncs and clubs.
+
+Registered by ``create_app`` as a blueprint without a command group, so the
+commands sit at the top level. ``db-upgrade`` is the only place the schema
+changes; run it once per deploy before starting the web and worker processes.
+"""
+import multiprocessing
+import time
+
+import click
+from flask import Blueprint, current_app
+
+from config import CLUB_CONFIGS, STRAVA_WEBHOOK_VERIFY_TOKEN
+from migrations import upgrade as upgrade_schema
+from models import db
+from models.user import User
+from services import reprocess
+from services.clubs import club_configs, save_club
+from services.jobs import batch_counts, enqueue_batch, latest_batch, new_batch_name, retry_failed, run_batch
+from services.strava import get_client
+from services.sync import handle_job
+from services.tokens import start_refresh_thread
+
+REPROCESS_REPORT_INTERVAL = 5  # Seconds between progress lines of reprocess-all-clubs
+
+bp = Blueprint('commands', __name__, cli_group=None)
+
+
+def reprocess_partition(partition, partitions, chunk_size):
+    """Reclassify one user partition in the current app context"""
+    last_report = 0.0
+
+    def report(progress):
+        nonlocal last_report
+        if progress.seconds - last_report >= REPROCESS_REPORT_INTERVAL:
+            last_report = progress.seconds
+            print(f"[{partition + 1}/{partitions}] {progress.checked} runs checked, "
+                  f"{progress.changed} changed, {progress.rate:.0f} runs/s", flush=True)
+
+    progress = reprocess.reprocess_clubs(partition=partition, partitions=partitions, chunk_size=chunk_size,
+                                         on_chunk=report)
+    return progress.checked, progress.changed
+
+
+def reprocess_partition_process(partition, partitions, chunk_size):
+    """Pool entry point: each spawned process builds its own app"""
+    from app import create_app
+    with create_app().app_context():
+        return reprocess_partition(partition, partitions, chunk_size)
+
+
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending migrations"""
+    applied = upgrade_schema()
+    print(f"Applied migrations: {', '.join(applied)}" if applied else "Schema is up to date")
+
+
+@bp.cli.command('check-indexes')
+def check_indexes_command():
+    """EXPLAIN each route's hot query and fail if one cannot use an index"""
+    from migrations import check_indexes
+    failed = False
+    for name, (indexed, plan) in check_indexes().items():
+        print(f"{'ok  ' if indexed else 'SCAN'} {name}: {' | '.join(plan)}")
+        failed = failed or not indexed
+    if failed:
+        raise SystemExit(1)
+
+
+@bp.cli.command('webhook-subscribe')
+@click.argument('callback_url')
+def webhook_subscribe_command(callback_url):
+    """Register CALLBACK_URL (ending in /webhook) as the Strava push subscription"""
+    res = get_client().create_push_subscription(callback_url, STRAVA_WEBHOOK_VERIFY_TOKEN)
+    print(f"{res.status_code}: {res.text}")
+    if res.status_code not in (200, 201):
+        raise SystemExit(1)
+
+
+@bp.cli.command('sync-all')
+@click.option('--concurrency', default=4, show_default=True, help='users synced at once')
+@click.option('--resume', is_flag=True, help='continue the last sync-all, retrying its failed users, instead of starting a new one')
+def sync_all_command(concurrency, resume):
+    """Sync every user from Strava, committing each user as it finishes"""
+    app = current_app._get_current_object()
+    if resume:
+        batch = latest_batch()
+        if batch is None:
+            raise click.ClickException("No sync-all run to resume")
+        retried = retry_failed(batch)
+        if retried:
+            print(f"{batch}: retrying {retried} failed users")
+    else:
+        batch = new_batch_name()
+        enqueue_batch([user_id for (user_id,) in db.session.query(User.id).order_by(User.id)], batch)
+    counts = batch_counts(batch)
+    print(f"{batch}: {counts.get('queued', 0)} users to sync, {counts.get('done', 0)} already done")
+
+    def on_done(job):
+        line = f"user {job.user_id}: {job.status}, {job.fetched} fetched, {job.added} added, {job.updated} updated"
+        print(line + (f" ({job.message})" if job.message else ""))
+
+    # Tokens of queued users are refreshed ahead of expiry while the batch runs
+    start_refresh_thread(app)
+    started = time.monotonic()
+    if not run_batch(app, handle_job, batch, concurrency, on_done=on_done):
+        print("Interrupted after the users in progress; continue with --resume")
+    counts = batch_counts(batch)
+    print(f"{batch}: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed, "
+          f"{counts.get('queued', 0) + counts.get('running', 0)} left in {time.monotonic() - started:.1f}s")
+    if counts.get('failed'):
+        raise SystemExit(1)
+
+
+@bp.cli.command('club-import')
+def club_import_command():
+    """Create or update the stored clubs from CLUB_CONFIGS in config.py"""
+    for name, config in CLUB_CONFIGS.items():
+        save_club(name, config)
+        print(f"Saved {name}")
+    print("Stored runs keep their club until `flask reprocess-all-clubs` is run")
+
+
+@bp.cli.command('reprocess-all-clubs')
+@click.option('--workers', default=1, show_default=True, help='processes, each taking the users with id % workers == n')
+@click.option('--chunk-size', default=reprocess.CHUNK_SIZE, show_default=True, help='runs read and committed at a time')
+def reprocess_all_clubs_command(workers, chunk_size):
+    """Re-run club detection on every stored run, e.g. after the clubs change"""
+    started = time.perf_counter()
+    partitions = [(partition, workers, chunk_size) for partition in range(workers)]
+    if workers == 1:
+        results = [reprocess_partition(*partitions[0])]
+    else:
+        # Spawn rather than fork so each process opens its own database connections
+        with multiprocessing.get_context('spawn').Pool(workers) as pool:
+            results = pool.starmap(reprocess_partition_process, partitions)
+    checked = sum(result[0] for result in results)
+    changed = sum(result[1] for result in results)
+    seconds = time.perf_counter() - started
+    print(f"Checked {checked} runs, changed {changed}, in {seconds:.1f}s ({checked / max(seconds, 1e-9):.0f} runs/s)")
+
+
+@bp.cli.command('club-list')
+def club_list_command():
+    """Show the stored clubs and their geofences"""
+    for name, config in club_configs().items():
+        window = config['time_window']
+        where = (f"{config['start_latlng']} r={config['radius_m']:.0f}m" if config['start_latlng']
+                 else f"city={config['location_city']}")
+        print(f"{name}: {','.join(config['days'])} {window['start']}-{window['end']} {where}")
@@ -7,6 +7,22 @@ load_dotenv()
 STRAVA_CLIENT_ID = os.environ.get('STRAVA_CLIENT_ID', 'your_client_id')
 STRAVA_CLIENT_SECRET = os.environ.get('STRAVA_CLIENT_SECRET', 'your_client_secret')
 STRAVA_REDIRECT_URI = os.environ.get('STRAVA_REDIRECT_URI', 'http://localhost:5555/callback')
+# Shared secret echoed by Strava when validating the webhook subscription
+STRAVA_WEBHOOK_VERIFY_TOKEN = os.environ.get('STRAVA_WEBHOOK_VERIFY_TOKEN', 'your_verify_token')
+STRAVA_WEBHOOK_SUBSCRIPTION_ID = os.environ.get('STRAVA_WEBHOOK_SUBSCRIPTION_ID')
+
+
+def database_url():
+    """SQLAlchemy URL from DATABASE_URL (works with Render's), SQLite locally"""
+    url = os.environ.get('DATABASE_URL', 'sqlite:///local.db')
+    # Fix postgres:// to postgresql:// for SQLAlchemy compatibility
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    # Force use of psycopg (not psycopg2) driver
+    if url.startswith('postgresql://') and '+psycopg' not in url:
+        url = url.replace('postgresql://', 'postgresql+psycopg://', 1)
+    return url
+
 
 CLUB_CONFIGS = {
     'URC Rotterdam': {
@@ -18,6 +34,7 @@ CLUB_CONFIGS = {
         'location_city': 'Rotterdam',
         'location_country': 'Netherlands',
         'start_latlng': [51.9225, 4.47917],  # Approximate center of Rotterdam
+        'radius_m': 5000,  # Geofence around start_latlng; wide while the point is the city center
         'description': 'Ukrainian Running Club in Rotterdam. We run & eat cakes every Sunday.'
     }
 }
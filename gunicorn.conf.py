@@ -0,0 +1,37 @@
+"""Gunicorn settings, read automatically from the working directory.
+
+    gunicorn 'app:create_app()'
+
+The app is built once in the master and workers are forked from it, sharing
+its imported code copy-on-write instead of each importing everything again.
+The bind address and worker count follow PORT and WEB_CONCURRENCY.
+``python benchmarks/bench_startup.py`` measures the difference.
+"""
+import gc
+
+from app import inline_worker_enabled, start_background_threads, warm_up
+from models import db
+
+preload_app = True
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        warm_up(server.app.wsgi())
+
+
+def pre_fork(server, worker):
+    # Objects loaded so far move to a permanent generation that collections never
+    # scan, so the garbage collector neither slows down on them nor dirties the
+    # pages the workers share
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    app = worker.wsgi
+    with app.app_context():
+        # A connection the master opened must not be shared with this process
+        db.engine.dispose(close=False)
+    # Threads do not survive the fork, so each worker starts its own
+    if inline_worker_enabled():
+        start_background_threads(app)
@@ -0,0 +1,237 @@
+"""Versioned schema migrations and an EXPLAIN-based index check.
+
+A fresh database is created from the models and stamped with every known
+version. An existing database gets each migration it has not recorded in
+``schema_version`` applied in order. Migrations are written to be idempotent
+so databases created before versioning existed can be brought up to date.
+
+    flask --app app db-upgrade
+    flask --app app check-indexes
+"""
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import column, delete, insert, inspect, select, table, text, update
+
+from models import db
+from models.club_leaderboard import ClubLeaderboard
+from models.daily_rollup import DailyRollup
+from models.job import SyncJob
+from models.run import Run
+from models.run_payload import RunPayload, payload_json, payload_row
+from models.schema_version import SchemaVersion
+from models.user import User
+from models.user_stats import UserStats
+from services.jobs import merge_after_date
+from services.leaderboard import month_key, rebuild_leaderboard
+from services.clubs import seed_clubs
+from services.rollups import rebuild_daily_rollups
+from services.rundays import rebuild_run_days
+
+BACKFILL_CHUNK_SIZE = 1000
+
+# The run table as it was before the payload moved to run_payload
+legacy_run = table('run', column('id'), column('strava_activity_id'), column('raw_json'))
+
+
+def add_missing_columns(table):
+    """ALTER TABLE ADD COLUMN for model columns the database does not have yet.
+
+    Returns the names of the columns that were added.
+    """
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    added = []
+    with db.engine.begin() as connection:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+            added.append(column.name)
+    return added
+
+
+def create_missing_indexes(table):
+    for index in table.indexes:
+        index.create(db.engine, checkfirst=True)
+
+
+def legacy_payload_chunks():
+    """(id, strava_activity_id, payload dict) chunks from run.raw_json, keyset-paginated"""
+    last_id = 0
+    while True:
+        chunk = db.session.execute(
+            select(legacy_run.c.id, legacy_run.c.strava_activity_id, legacy_run.c.raw_json)
+            .where(legacy_run.c.id > last_id, legacy_run.c.raw_json.isnot(None))
+            .order_by(legacy_run.c.id)
+            .limit(BACKFILL_CHUNK_SIZE)
+        ).all()
+        if not chunk:
+            return
+        # Text on SQLite, JSONB (already decoded) on PostgreSQL
+        yield [(run_id, activity_id, json.loads(raw) if isinstance(raw, str) else raw)
+               for run_id, activity_id, raw in chunk]
+        last_id = chunk[-1][0]
+
+
+def backfill_run_columns():
+    """Populate the columns promoted out of the raw payload"""
+    for chunk in legacy_payload_chunks():
+        db.session.execute(update(Run), [{'id': run_id, **Run.columns_from_strava_json(data)}
+                                         for run_id, _, data in chunk])
+        db.session.commit()
+
+
+def promote_run_columns():
+    if add_missing_columns(Run.__table__):
+        backfill_run_columns()
+
+
+def index_run_table():
+    create_missing_indexes(Run.__table__)
+
+
+def add_job_kind():
+    if add_missing_columns(SyncJob.__table__):
+        db.session.execute(update(SyncJob).where(SyncJob.kind.is_(None)).values(kind='sync'))
+        db.session.commit()
+
+
+def add_token_refresh_lock():
+    add_missing_columns(User.__table__)
+
+
+def add_job_batch():
+    add_missing_columns(SyncJob.__table__)
+    create_missing_indexes(SyncJob.__table__)
+
+
+def compress_run_payloads():
+    """Move run.raw_json into run_payload, zlib-compressed, and drop the column"""
+    if 'raw_json' not in {column['name'] for column in inspect(db.engine).get_columns('run')}:
+        return
+    for chunk in legacy_payload_chunks():
+        activity_ids = [activity_id for _, activity_id, _ in chunk]
+        # Rows copied by an interrupted earlier attempt are replaced
+        db.session.execute(delete(RunPayload).where(RunPayload.strava_activity_id.in_(activity_ids)))
+        db.session.execute(insert(RunPayload), [payload_row(activity_id, payload_json(data))
+                                                for _, activity_id, data in chunk])
+        db.session.commit()
+    with db.engine.begin() as connection:
+        connection.execute(text('ALTER TABLE run DROP COLUMN raw_json'))
+
+
+def index_queued_syncs():
+    """Fold duplicate waiting syncs into each user's oldest one, then add the unique index"""
+    queued = SyncJob.query.filter_by(kind='sync', status='queued').order_by(SyncJob.id).all()
+    kept = {}
+    for job in queued:
+        if job.user_id not in kept:
+            kept[job.user_id] = job
+            continue
+        merge_after_date(kept[job.user_id], job.after_date)
+        kept[job.user_id].batch = job.batch or kept[job.user_id].batch
+        db.session.delete(job)
+    db.session.commit()
+    create_missing_indexes(SyncJob.__table__)
+
+
+def add_job_not_before():
+    add_missing_columns(SyncJob.__table__)
+
+
+def build_run_calendar():
+    # Leaderboard run days are read from the masks, so rebuild it on top of them
+    rebuild_run_days()
+    rebuild_leaderboard()
+
+
+# (version, name, function) in the order they must run; append only
+MIGRATIONS = [
+    (1, 'promote_run_columns', promote_run_columns),
+    (2, 'build_club_leaderboard', rebuild_leaderboard),
+    (3, 'index_run_table', index_run_table),
+    (4, 'add_job_kind', add_job_kind),
+    (5, 'add_token_refresh_lock', add_token_refresh_lock),
+    (6, 'build_run_calendar', build_run_calendar),
+    (7, 'build_daily_rollups', rebuild_daily_rollups),
+    (8, 'seed_clubs', seed_clubs),
+    (9, 'add_job_batch', add_job_batch),
+    (10, 'compress_run_payloads', compress_run_payloads),
+    (11, 'index_queued_syncs', index_queued_syncs),
+    (12, 'add_job_not_before', add_job_not_before),
+]
+
+# Data migrations, which a database freshly created from the models still needs
+DATA_MIGRATIONS = {'seed_clubs'}
+
+
+def upgrade():
+    """Create missing tables and apply pending migrations; returns the names applied"""
+    fresh = not inspect(db.engine).get_table_names()
+    db.create_all()
+    applied = {version for (version,) in db.session.query(SchemaVersion.version)}
+    ran = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        # Tables created from the current models already have everything but data
+        if not fresh or name in DATA_MIGRATIONS:
+            migrate()
+            ran.append(name)
+        db.session.add(SchemaVersion(version=version, name=name))
+        db.session.commit()
+    return ran
+
+
+# --- Index check ---
+
+def hot_queries():
+    """The statement behind each route's main read, with representative parameters"""
+    year_start, year_end = datetime(2024, 1, 1), datetime(2025, 1, 1)
+    return {
+        'index': db.session.query(Run)
+            .filter(Run.user_id == 1, Run.start_date >= year_start, Run.start_date < year_end)
+            .order_by(Run.start_date),
+        'club_runs': db.session.query(Run)
+            .filter(Run.user_id == 1, Run.club_name == 'Club')
+            .order_by(Run.start_date),
+        'stats': db.session.query(UserStats).filter(UserStats.user_id == 1),
+        'daily_rollup': db.session.query(DailyRollup)
+            .filter(DailyRollup.user_id == 1, DailyRollup.day >= '2024-01-01', DailyRollup.day <= '2024-12-31'),
+        'stats_refresh': db.session.query(Run.distance)
+            .filter(Run.user_id == 1, Run.start_date_local >= year_start, Run.start_date_local < year_end),
+        'club_rank': db.session.query(ClubLeaderboard)
+            .filter(ClubLeaderboard.club_name == 'Club',
+                    ClubLeaderboard.month >= '2024-01', ClubLeaderboard.month <= '2024-12'),
+        'club_runs_by_date': db.session.query(Run.id, month_key(Run.start_date_local))
+            .filter(Run.club_name == 'Club', Run.start_date_local >= year_start,
+                    Run.start_date_local < year_start + timedelta(days=31)),
+    }
+
+
+def explain(query):
+    """Query plan lines for an ORM query on the current dialect"""
+    dialect = db.engine.dialect
+    compiled = query.statement.compile(dialect=dialect)
+    with db.engine.connect() as connection:
+        if dialect.name == 'postgresql':
+            # Tiny tables make sequential scans cheapest; ask whether an index *can* serve the query
+            connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', compiled.params)
+            return [row[0] for row in rows]
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+        return [row[-1] for row in rows]
+
+
+def uses_index(plan):
+    markers = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan',  # PostgreSQL
+               'USING INDEX', 'USING COVERING INDEX', 'USING PRIMARY KEY', 'USING INTEGER PRIMARY KEY')  # SQLite
+    return any(marker in line for line in plan for marker in markers)
+
+
+def check_indexes():
+    """{route: (uses_index, plan)} for every hot query"""
+    return {name: (uses_index(plan), plan) for name, plan in
+            ((name, explain(query)) for name, query in hot_queries().items())}
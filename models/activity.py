@@ -1,133 +1,135 @@
-from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, List, Any
+from typing import Optional
 import pytz
-from config import CLUB_CONFIGS
+from services.clubs import get_club_matcher
+
+# Fields without an entry here are required in Strava's activity payload
+FIELD_DEFAULTS = {
+    'start_latlng': None,
+    'end_latlng': None,
+    'average_heartrate': None,
+    'max_heartrate': None,
+    'kudos_count': 0,
+    'athlete_count': 1,
+    'private': False,
+    'resource_state': 2,
+    'athlete': {},
+    'sport_type': 'Run',
+    'workout_type': None,
+    'utc_offset': 0,
+    'location_city': None,
+    'location_state': None,
+    'location_country': None,
+    'achievement_count': 0,
+    'comment_count': 0,
+    'photo_count': 0,
+    'map': {},
+    'trainer': False,
+    'commute': False,
+    'manual': False,
+    'visibility': 'everyone',
+    'flagged': False,
+    'gear_id': None,
+    'average_cadence': None,
+    'average_watts': None,
+    'max_watts': None,
+    'weighted_average_watts': None,
+    'device_watts': False,
+    'kilojoules': None,
+    'has_heartrate': False,
+    'heartrate_opt_out': False,
+    'display_hide_heartrate_option': False,
+    'elev_high': None,
+    'elev_low': None,
+    'upload_id': None,
+    'upload_id_str': None,
+    'external_id': None,
+    'from_accepted_tag': False,
+    'pr_count': 0,
+    'total_photo_count': 0,
+    'has_kudoed': False,
+}
+REQUIRED_FIELDS = ('id', 'name', 'distance', 'moving_time', 'elapsed_time', 'total_elevation_gain',
+                   'type', 'start_date', 'start_date_local', 'timezone', 'average_speed', 'max_speed')
+
+
+def parse_strava_timestamp(value: str) -> datetime:
+    """Parse Strava's fixed 'YYYY-MM-DDTHH:MM:SSZ' format as an aware UTC datetime"""
+    return datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                    int(value[11:13]), int(value[14:16]), int(value[17:19]), tzinfo=pytz.UTC)
+
 
-@dataclass
 class Activity:
-    id: int
-    name: str
-    distance: float
-    moving_time: int
-    elapsed_time: int
-    total_elevation_gain: float
-    type: str
-    start_date: datetime
-    start_date_local: datetime
-    timezone: str
-    start_latlng: Optional[List[float]]
-    end_latlng: Optional[List[float]]
-    average_speed: float
-    max_speed: float
-    average_heartrate: Optional[float]
-    max_heartrate: Optional[float]
-    kudos_count: int
-    athlete_count: int
-    private: bool
-    # Additional required fields
-    resource_state: int
-    athlete: dict
-    sport_type: str
-    workout_type: Optional[int]
-    utc_offset: float
-    location_city: Optional[str]
-    location_state: Optional[str]
-    location_country: Optional[str]
-    achievement_count: int
-    comment_count: int
-    photo_count: int
-    map: dict
-    trainer: bool
-    commute: bool
-    manual: bool
-    visibility: str
-    flagged: bool
-    gear_id: Optional[str]
-    average_cadence: Optional[float]
-    average_watts: Optional[float]
-    max_watts: Optional[float]
-    weighted_average_watts: Optional[float]
-    device_watts: bool
-    kilojoules: Optional[float]
-    has_heartrate: bool
-    heartrate_opt_out: bool
-    display_hide_heartrate_option: bool
-    elev_high: Optional[float]
-    elev_low: Optional[float]
-    upload_id: Optional[int]
-    upload_id_str: Optional[str]
-    external_id: Optional[str]
-    from_accepted_tag: bool
-    pr_count: int
-    total_photo_count: int
-    has_kudoed: bool
-    club_name: Optional[str] = None
+    """Read-only view over a Strava activity dict.
+
+    Only the raw dict is kept; fields are read from it on access and the two
+    timestamps are parsed once, on first use.
+    """
+    __slots__ = ('_data', '_start_date', '_start_date_local', 'club_name')
+
+    def __init__(self, data: dict):
+        self._data = data
+        self._start_date = None
+        self._start_date_local = None
+        self.club_name: Optional[str] = None
 
     @classmethod
     def from_strava_json(cls, data: dict) -> 'Activity':
-        activity = cls(
-            id=data['id'],
-            name=data['name'],
-            distance=data['distance'],
-            moving_time=data['moving_time'],
-            elapsed_time=data['elapsed_time'],
-            total_elevation_gain=data['total_elevation_gain'],
-            type=data['type'],
-            start_date=datetime.strptime(data['start_date'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=pytz.UTC),
-            start_date_local=datetime.strptime(data['start_date_local'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=pytz.UTC),
-            timezone=data['timezone'],
-            start_latlng=data.get('start_latlng'),
-            end_latlng=data.get('end_latlng'),
-            average_speed=data['average_speed'],
-            max_speed=data['max_speed'],
-            average_heartrate=data.get('average_heartrate'),
-            max_heartrate=data.get('max_heartrate'),
-            kudos_count=data.get('kudos_count', 0),
-            athlete_count=data.get('athlete_count', 1),
-            private=data.get('private', False),
-            # Additional fields with defaults
-            resource_state=data.get('resource_state', 2),
-            athlete=data.get('athlete', {}),
-            sport_type=data.get('sport_type', 'Run'),
-            workout_type=data.get('workout_type'),
-            utc_offset=data.get('utc_offset', 0),
-            location_city=data.get('location_city'),
-            location_state=data.get('location_state'),
-            location_country=data.get('location_country'),
-            achievement_count=data.get('achievement_count', 0),
-            comment_count=data.get('comment_count', 0),
-            photo_count=data.get('photo_count', 0),
-            map=data.get('map', {}),
-            trainer=data.get('trainer', False),
-            commute=data.get('commute', False),
-            manual=data.get('manual', False),
-            visibility=data.get('visibility', 'everyone'),
-            flagged=data.get('flagged', False),
-            gear_id=data.get('gear_id'),
-            average_cadence=data.get('average_cadence'),
-            average_watts=data.get('average_watts'),
-            max_watts=data.get('max_watts'),
-            weighted_average_watts=data.get('weighted_average_watts'),
-            device_watts=data.get('device_watts', False),
-            kilojoules=data.get('kilojoules'),
-            has_heartrate=data.get('has_heartrate', False),
-            heartrate_opt_out=data.get('heartrate_opt_out', False),
-            display_hide_heartrate_option=data.get('display_hide_heartrate_option', False),
-            elev_high=data.get('elev_high'),
-            elev_low=data.get('elev_low'),
-            upload_id=data.get('upload_id'),
-            upload_id_str=data.get('upload_id_str'),
-            external_id=data.get('external_id'),
-            from_accepted_tag=data.get('from_accepted_tag', False),
-            pr_count=data.get('pr_count', 0),
-            total_photo_count=data.get('total_photo_count', 0),
-            has_kudoed=data.get('has_kudoed', False),
-            club_name=None
-        )
+        activity = cls(data)
         activity.detect_club_run()
         return activity
 
+    def __getattr__(self, name):
+        # Only reached for names that are not slots or properties
+        if name in FIELD_DEFAULTS:
+            return self._data.get(name, FIELD_DEFAULTS[name])
+        if name in REQUIRED_FIELDS:
+            return self._data[name]
+        raise AttributeError(f"'Activity' object has no attribute '{name}'")
+
+    def __repr__(self) -> str:
+        return f"Activity(id={self._data.get('id')!r}, name={self._data.get('name')!r})"
+
+    @property
+    def raw(self) -> dict:
+        return self._data
+
+    @property
+    def id(self) -> int:
+        return self._data['id']
+
+    @property
+    def name(self) -> str:
+        return self._data['name']
+
+    @property
+    def distance(self) -> float:
+        return self._data['distance']
+
+    @property
+    def moving_time(self) -> int:
+        return self._data['moving_time']
+
+    @property
+    def start_date(self) -> datetime:
+        if self._start_date is None:
+            self._start_date = parse_strava_timestamp(self._data['start_date'])
+        return self._start_date
+
+    @property
+    def start_date_local(self) -> datetime:
+        if self._start_date_local is None:
+            self._start_date_local = parse_strava_timestamp(self._data['start_date_local'])
+        return self._start_date_local
+
+    @property
+    def location_city(self) -> Optional[str]:
+        return self._data.get('location_city')
+
+    @property
+    def location_country(self) -> Optional[str]:
+        return self._data.get('location_country')
+
     @property
     def pace_per_km(self) -> float:
         """Calculate pace in minutes per kilometer"""
@@ -151,21 +153,8 @@ class Activity:
         return f"{pace_minutes}:{pace_seconds:02d}"
 
     def detect_club_run(self) -> None:
-        """Detect if this is a club run based on day and time"""
-        self.club_name = None
-        run_date = self.start_date_local
-        if run_date is None:
-            return
-        run_time = run_date.time()
-
-        for club_name, config in CLUB_CONFIGS.items():
-            # Check if run is on configured day
-            if run_date.strftime('%A') in config['days']:
-                # Convert time window to time objects
-                start_time = datetime.strptime(config['time_window']['start'], '%H:%M').time()
-                end_time = datetime.strptime(config['time_window']['end'], '%H:%M').time()
-                
-                # Check if run time is within window
-                if start_time <= run_time <= end_time:
-                    self.club_name = club_name
-                    break
\ No newline at end of file
+        """Detect if this is a club run based on day, time and start point (or city and country)"""
+        lat, lng = self._data.get('start_latlng') or (None, None)
+        self.club_name = get_club_matcher().match(
+            self.start_date_local, self.location_city, self.location_country, lat, lng
+        )
@@ -0,0 +1,30 @@
+from datetime import datetime
+from . import db
+
+class Club(db.Model):
+    """A club meeting: weekdays, a local time window and a geofence around the meeting point"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, unique=True, nullable=False)
+    slug = db.Column(db.String, unique=True, nullable=False)
+    description = db.Column(db.String)
+    days = db.Column(db.String, nullable=False)          # Comma-separated day names, 'Sunday'
+    time_start = db.Column(db.String, nullable=False)    # 'HH:MM', local time
+    time_end = db.Column(db.String, nullable=False)
+    location_city = db.Column(db.String)
+    location_country = db.Column(db.String)
+    lat = db.Column(db.Float)                            # Meeting point; None falls back to city matching
+    lng = db.Column(db.Float)
+    radius_m = db.Column(db.Float)                       # Geofence radius in meters
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_config(self):
+        """The club in the shape of a CLUB_CONFIGS entry"""
+        return {
+            'days': self.days.split(','),
+            'time_window': {'start': self.time_start, 'end': self.time_end},
+            'location_city': self.location_city,
+            'location_country': self.location_country,
+            'start_latlng': [self.lat, self.lng] if self.lat is not None and self.lng is not None else None,
+            'radius_m': self.radius_m,
+            'description': self.description,
+        }
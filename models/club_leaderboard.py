@@ -0,0 +1,11 @@
+from . import db
+
+class ClubLeaderboard(db.Model):
+    """Monthly club totals per runner, maintained as runs are stored or reclassified"""
+    club_name = db.Column(db.String, primary_key=True)
+    month = db.Column(db.String, primary_key=True)     # 'YYYY-MM' of start_date_local
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_runs = db.Column(db.Integer, nullable=False, default=0)
+    run_days = db.Column(db.Integer, nullable=False, default=0)       # Distinct local dates
+    distance = db.Column(db.Float, nullable=False, default=0)         # In meters
+    moving_time = db.Column(db.Integer, nullable=False, default=0)    # In seconds
@@ -0,0 +1,10 @@
+from . import db
+
+class DailyRollup(db.Model):
+    """Per-user totals for one local day, maintained as runs are stored or deleted"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.String, primary_key=True)                       # 'YYYY-MM-DD' of start_date_local
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    distance = db.Column(db.Float, nullable=False, default=0)          # In meters
+    moving_time = db.Column(db.Integer, nullable=False, default=0)     # In seconds
+    elevation_gain = db.Column(db.Float, nullable=False, default=0)    # In meters
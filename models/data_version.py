@@ -0,0 +1,8 @@
+from datetime import datetime
+from . import db
+
+class DataVersion(db.Model):
+    """Counter bumped whenever the data behind a cache scope ('user:1', 'club:URC Rotterdam') changes"""
+    scope = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
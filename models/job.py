@@ -0,0 +1,46 @@
+from datetime import datetime
+from . import db
+
+class SyncJob(db.Model):
+    """A queued Strava sync or webhook event, claimed and run by a background worker"""
+    __table_args__ = (
+        # At most one waiting sync per user, so concurrent refreshes cannot queue it twice
+        db.Index('uq_sync_job_user_id_kind_queued', 'user_id', 'kind', unique=True,
+                 sqlite_where=db.text("status = 'queued' AND kind = 'sync'"),
+                 postgresql_where=db.text("status = 'queued' AND kind = 'sync'")),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    kind = db.Column(db.String, nullable=False, default='sync')   # sync, or activity for a webhook event
+    status = db.Column(db.String, nullable=False, default='queued', index=True)  # queued, running, done, failed
+    payload = db.Column(db.Text)                # JSON webhook event for activity jobs
+    batch = db.Column(db.String, index=True)    # The sync-all run that queued the job, if any
+    after_date = db.Column(db.BigInteger)     # Epoch seconds to sync from; None syncs from the high-water mark
+    fetched = db.Column(db.Integer, nullable=False, default=0)       # Activities fetched so far
+    added = db.Column(db.Integer, nullable=False, default=0)         # New runs stored so far
+    updated = db.Column(db.Integer, nullable=False, default=0)       # Stored runs that changed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    not_before = db.Column(db.DateTime)         # Not claimed earlier; set while the Strava budget is spent
+    message = db.Column(db.String)
+    worker = db.Column(db.String)               # host:pid of the worker holding the job
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)       # Last progress update while running
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'fetched': self.fetched,
+            'added': self.added,
+            'updated': self.updated,
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
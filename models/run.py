@@ -1,9 +1,16 @@
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import Text
+from typing import Optional
+from sqlalchemy import event
 from . import db
+from .run_payload import RunPayload, decompress_payload
 
 class Run(db.Model):
+    # Composite indexes matching the hot queries: a user's runs by date, a club's runs by local date
+    __table_args__ = (
+        db.Index('ix_run_user_id_start_date', 'user_id', 'start_date'),
+        db.Index('ix_run_club_name_start_date_local', 'club_name', 'start_date_local'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     strava_activity_id = db.Column(db.String, unique=True, nullable=False)
@@ -13,8 +20,24 @@ class Run(db.Model):
     distance = db.Column(db.Float)              # In meters
     moving_time = db.Column(db.Integer)            # In seconds
     club_name = db.Column(db.String)
-    # Use Text for SQLite compatibility, JSONB for PostgreSQL
-    raw_json = db.Column(Text().with_variant(JSONB, 'postgresql'))
+    # Promoted from raw_json so detection and analytics never decode the payload
+    location_city = db.Column(db.String)
+    location_country = db.Column(db.String)
+    start_lat = db.Column(db.Float)
+    start_lng = db.Column(db.Float)
+    elapsed_time = db.Column(db.Integer)        # In seconds
+    total_elevation_gain = db.Column(db.Float)  # In meters
+    average_heartrate = db.Column(db.Float)
+    max_heartrate = db.Column(db.Float)
+    # The full Strava payload lives compressed in run_payload; see raw
+
+    @property
+    def raw(self) -> Optional[dict]:
+        """The Strava activity as stored, loaded and decompressed on first use and kept until the run expires"""
+        if '_raw' not in self.__dict__:
+            payload = db.session.get(RunPayload, self.strava_activity_id)
+            self.__dict__['_raw'] = decompress_payload(payload.data) if payload else None
+        return self.__dict__['_raw']
 
     @property
     def pace_per_km(self) -> float:
@@ -41,50 +64,24 @@ class Run(db.Model):
         pace_seconds = int((pace - pace_minutes) * 60)
         return f"{pace_minutes}:{pace_seconds:02d}"
 
-    def detect_club_run(self):
-        """Detect if this is a club run based on day, time, city and country"""
-        from config import CLUB_CONFIGS
-        import json
-        
-        self.club_name = None
-        run_date = self.start_date_local
-        if run_date is None:
-            return
-        
-        run_time = run_date.time()
-        
-        # Parse raw_json to get location data
-        location_city = None
-        location_country = None
-        if self.raw_json:
-            try:
-                activity_data = json.loads(self.raw_json) if isinstance(self.raw_json, str) else self.raw_json
-                location_city = activity_data.get('location_city')
-                location_country = activity_data.get('location_country')
-            except (json.JSONDecodeError, AttributeError):
-                pass
-        
-        for club_name, config in CLUB_CONFIGS.items():
-            # Check if run is on configured day
-            if run_date.strftime('%A') not in config['days']:
-                continue
-            
-            # Check city if configured
-            if config.get('location_city') and location_city:
-                if config['location_city'].lower() != location_city.lower():
-                    continue
-            
-            # Check country if configured
-            if config.get('location_country') and location_country:
-                if config['location_country'].lower() != location_country.lower():
-                    continue
-            
-            # Convert time window to time objects
-            from datetime import datetime
-            start_time = datetime.strptime(config['time_window']['start'], '%H:%M').time()
-            end_time = datetime.strptime(config['time_window']['end'], '%H:%M').time()
-            
-            # Check if run time is within window
-            if start_time <= run_time <= end_time:
-                self.club_name = club_name
-                break
\ No newline at end of file
+    @staticmethod
+    def columns_from_strava_json(data: dict) -> dict:
+        """Values for the promoted columns, taken from a Strava activity dict"""
+        start_latlng = data.get('start_latlng') or [None, None]
+        return {
+            'location_city': data.get('location_city'),
+            'location_country': data.get('location_country'),
+            'start_lat': start_latlng[0],
+            'start_lng': start_latlng[1],
+            'elapsed_time': data.get('elapsed_time'),
+            'total_elevation_gain': data.get('total_elevation_gain'),
+            'average_heartrate': data.get('average_heartrate'),
+            'max_heartrate': data.get('max_heartrate'),
+        }
+
+
+@event.listens_for(Run, 'expire')
+@event.listens_for(Run, 'refresh')
+def forget_raw(run, *args):
+    # Payloads are written by statements that commit, and a commit expires every loaded run
+    run.__dict__.pop('_raw', None)
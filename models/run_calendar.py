@@ -0,0 +1,8 @@
+from . import db
+
+class RunCalendar(db.Model):
+    """Days a user ran in one year as a bitset; bit n is day n of the year (Jan 1 = bit 0)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    club_name = db.Column(db.String, primary_key=True, default='')   # '' covers every run
+    days = db.Column(db.LargeBinary, nullable=False)                  # 46 bytes, little-endian
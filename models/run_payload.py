@@ -0,0 +1,34 @@
+import hashlib
+import json
+import zlib
+
+from . import db
+
+COMPRESSION_LEVEL = 6  # Higher levels gain nothing on single activities
+
+
+def payload_json(activity: dict) -> bytes:
+    """Compact JSON of a Strava activity dict"""
+    return json.dumps(activity, separators=(',', ':')).encode()
+
+
+def payload_digest(body: bytes) -> bytes:
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+def payload_row(activity_id: str, body: bytes) -> dict:
+    """A RunPayload row for the payload_json() of an activity"""
+    return {'strava_activity_id': activity_id, 'data': zlib.compress(body, COMPRESSION_LEVEL),
+            'digest': payload_digest(body)}
+
+
+def decompress_payload(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+
+class RunPayload(db.Model):
+    """The full Strava activity JSON of a run, compressed and kept out of the run table"""
+    strava_activity_id = db.Column(db.String, db.ForeignKey('run.strava_activity_id', ondelete='CASCADE'),
+                                   primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)    # zlib-compressed payload_json()
+    digest = db.Column(db.LargeBinary, nullable=False)  # Of the uncompressed JSON, so unchanged payloads skip compression
@@ -0,0 +1,8 @@
+from datetime import datetime
+from . import db
+
+class SchemaVersion(db.Model):
+    """One row per migration applied by migrations.upgrade()"""
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,8 @@
+from . import db
+
+class SyncState(db.Model):
+    """Per-user high-water mark so refreshes only fetch newer activities"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    last_activity_at = db.Column(db.DateTime)   # UTC start of the newest activity fetched
+    last_page_hash = db.Column(db.String)       # SHA-1 of the newest page, to skip unchanged re-fetches
+    last_synced_at = db.Column(db.DateTime)
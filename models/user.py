@@ -7,4 +7,7 @@ class User(db.Model):
     profile_photo = db.Column(db.String)
     access_token = db.Column(db.String, nullable=False)
     refresh_token = db.Column(db.String, nullable=False)
-    token_expires_at = db.Column(db.DateTime, nullable=False)
\ No newline at end of file
+    token_expires_at = db.Column(db.DateTime, nullable=False)
+    # Single-flight lease for token refresh, taken with a conditional UPDATE
+    token_refresh_owner = db.Column(db.String)
+    token_refresh_until = db.Column(db.DateTime)
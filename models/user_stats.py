@@ -0,0 +1,17 @@
+from . import db
+
+class UserStats(db.Model):
+    """Per-user aggregates behind /stats, refreshed whenever the user's runs change"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_runs = db.Column(db.Integer, nullable=False, default=0)
+    total_days_running = db.Column(db.Integer, nullable=False, default=0)
+    total_distance = db.Column(db.Float, nullable=False, default=0)        # In meters
+    total_moving_time = db.Column(db.Integer, nullable=False, default=0)   # In seconds
+    longest_distance = db.Column(db.Float, nullable=False, default=0)      # In meters
+    longest_run_name = db.Column(db.String)
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)      # In days
+    year = db.Column(db.Integer)                # Year the year_* figures cover
+    year_runs = db.Column(db.Integer, nullable=False, default=0)
+    year_distance = db.Column(db.Float, nullable=False, default=0)         # In meters
+    year_moving_time = db.Column(db.Integer, nullable=False, default=0)    # In seconds
+    updated_at = db.Column(db.DateTime)
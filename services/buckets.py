@@ -0,0 +1,77 @@
+"""Calendar bucketing for runs.
+
+Calendars are memoized per year, and runs are assigned to consecutive
+[start, end) periods with a binary search over the period starts, so grouping
+costs O(runs * log periods) whatever the span of years.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import attrgetter
+
+import pytz
+
+
+def to_naive_utc(dt):
+    """Stored datetimes are naive UTC; normalise aware ones to match"""
+    if dt.tzinfo is not None:
+        return dt.astimezone(pytz.UTC).replace(tzinfo=None)
+    return dt
+
+
+@lru_cache(maxsize=64)
+def year_week_ranges(year):
+    """Week ranges (Monday-Sunday) starting on the first Monday of the year"""
+    current_start = datetime(year, 1, 1, tzinfo=pytz.UTC)
+    current_start += timedelta(days=(7 - current_start.weekday()) % 7)
+    week_ranges = []
+    while current_start.year == year:
+        week_end = current_start + timedelta(days=7)
+        week_ranges.append({
+            'start': current_start,
+            'end': week_end,
+            'week_num': current_start.isocalendar()[1]
+        })
+        current_start = week_end
+    return tuple(week_ranges)
+
+
+@lru_cache(maxsize=64)
+def year_month_ranges(year):
+    """Calendar month ranges of the year, keyed 'YYYY-MM'"""
+    month_ranges = []
+    for month in range(1, 13):
+        start = datetime(year, month, 1, tzinfo=pytz.UTC)
+        end = datetime(year + 1, 1, 1, tzinfo=pytz.UTC) if month == 12 else datetime(year, month + 1, 1, tzinfo=pytz.UTC)
+        month_ranges.append({'start': start, 'end': end, 'month': start.strftime('%Y-%m')})
+    return tuple(month_ranges)
+
+
+def week_ranges(start_year, end_year=None):
+    """Consecutive week ranges covering start_year through end_year inclusive"""
+    return [week for year in range(start_year, (end_year or start_year) + 1) for week in year_week_ranges(year)]
+
+
+def month_ranges(start_year, end_year=None):
+    """Consecutive month ranges covering start_year through end_year inclusive"""
+    return [month for year in range(start_year, (end_year or start_year) + 1) for month in year_month_ranges(year)]
+
+
+def bucket_runs(runs, ranges, key=attrgetter('start_date')):
+    """Assign runs to sorted, non-overlapping [start, end) ranges in a single pass.
+
+    Returns ``(range, runs)`` pairs for the ranges that received at least one
+    run; runs keep their input order within a range.
+    """
+    starts = [to_naive_utc(period['start']) for period in ranges]
+    ends = [to_naive_utc(period['end']) for period in ranges]
+    buckets = [[] for _ in ranges]
+    for run in runs:
+        value = key(run)
+        if value is None:
+            continue
+        value = to_naive_utc(value)
+        index = bisect_right(starts, value) - 1
+        if index >= 0 and value < ends[index]:
+            buckets[index].append(run)
+    return [(period, bucket) for period, bucket in zip(ranges, buckets) if bucket]
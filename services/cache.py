@@ -0,0 +1,189 @@
+"""Data-versioned response cache with ETag / Last-Modified support.
+
+Pages declare the scopes their content depends on (``user:<id>``,
+``club:<name>``, ``users``). Each scope has a version counter in the
+``data_version`` table that writers bump when the data changes; the ETag of
+a page is a hash of its URL and the versions of its scopes, so a bump
+invalidates every cached copy at once without explicit purging.
+
+Rendered bodies are kept in a size-bounded LRU store. The default SQLite
+backend is a local file shared by every gunicorn worker on the host; the
+memory backend is per process.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+import pytz
+from flask import make_response, request
+
+from models import db
+from models.data_version import DataVersion
+from services.storage import LocalSQLite, dialect_insert
+
+CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'sqlite')  # sqlite, memory or none
+CACHE_PATH = os.environ.get('RESPONSE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'strava-board-cache.sqlite3'))
+CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '512'))
+# Entries are b'<content type>\n<body>'; the prefix keeps older body-only entries from being read
+CACHE_KEY_PREFIX = 'v2:'
+
+
+class MemoryLRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteLRUCache:
+    """LRU cache in a local SQLite file, shared by all processes on the host"""
+
+    def __init__(self, path, max_entries):
+        self.max_entries = max_entries
+        self.store = LocalSQLite(path, timeout=5)
+        with self.store.transaction() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, accessed REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_accessed ON response_cache (accessed)')
+
+    def get(self, key):
+        try:
+            with self.store.transaction() as connection:
+                row = connection.execute('SELECT value FROM response_cache WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    connection.execute('UPDATE response_cache SET accessed = ? WHERE key = ?', (time.time(), key))
+                return row[0] if row else None
+        except sqlite3.OperationalError:
+            return None  # A busy cache is a miss, never an error
+
+    def set(self, key, value):
+        try:
+            with self.store.transaction() as connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO response_cache (key, value, accessed) VALUES (?, ?, ?)',
+                    (key, value, time.time())
+                )
+                connection.execute(
+                    'DELETE FROM response_cache WHERE key IN ('
+                    ' SELECT key FROM response_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,)
+                )
+        except sqlite3.OperationalError:
+            pass
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None and CACHE_BACKEND != 'none':
+        if CACHE_BACKEND == 'memory':
+            _backend = MemoryLRUCache(CACHE_MAX_ENTRIES)
+        else:
+            _backend = SQLiteLRUCache(CACHE_PATH, CACHE_MAX_ENTRIES)
+    return _backend
+
+
+def bump_versions(scopes):
+    """Invalidate every cached page depending on any of the scopes; commits"""
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    now = datetime.utcnow()
+    stmt = dialect_insert(DataVersion)
+    if stmt is not None:
+        stmt = stmt.values([{'scope': scope, 'version': 1, 'updated_at': now} for scope in scopes])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[DataVersion.scope],
+            set_={'version': DataVersion.version + 1, 'updated_at': now}
+        ))
+    else:
+        for scope in scopes:
+            row = db.session.get(DataVersion, scope) or DataVersion(scope=scope, version=0)
+            row.version += 1
+            row.updated_at = now
+            db.session.add(row)
+    db.session.commit()
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def club_scope(club_name):
+    return f'club:{club_name}'
+
+
+def cached_response(scopes):
+    """Cache a view's 200 responses per URL and data version; answer conditional requests with 304.
+
+    ``scopes(**view_args)`` returns the scopes the page depends on.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            page_scopes = sorted(scopes(**kwargs))
+            versions = dict(
+                db.session.query(DataVersion.scope, DataVersion)
+                .filter(DataVersion.scope.in_(page_scopes))
+            )
+            # The current date is part of the key so pages roll over at midnight (streaks
+            # and the current year), and the database URL keeps apps sharing the cache apart
+            basis = '|'.join([request.full_path, str(datetime.now(pytz.UTC).date()), str(db.engine.url)] + [
+                f'{scope}={versions[scope].version if scope in versions else 0}' for scope in page_scopes
+            ])
+            etag = hashlib.sha1(basis.encode()).hexdigest()
+            last_modified = max((v.updated_at for v in versions.values()), default=None)
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=pytz.UTC, microsecond=0)
+
+            if request.if_none_match.contains(etag) or (
+                not request.if_none_match and last_modified is not None
+                and request.if_modified_since is not None and request.if_modified_since >= last_modified
+            ):
+                response = make_response('', 304)
+            else:
+                backend = get_backend()
+                key = CACHE_KEY_PREFIX + etag
+                entry = backend.get(key) if backend else None
+                if entry is not None:
+                    content_type, body = entry.split(b'\n', 1)
+                    response = make_response(body)
+                    response.content_type = content_type.decode()
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if backend and response.status_code == 200 and not response.is_streamed:
+                        backend.set(key, response.content_type.encode() + b'\n' + response.get_data())
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                if last_modified is not None:
+                    response.last_modified = last_modified
+                # Browsers may keep the page but must revalidate, and it is per user
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
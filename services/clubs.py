@@ -0,0 +1,223 @@
+"""Club detection compiled from the ``club`` table.
+
+Clubs are stored in the database, seeded from ``CLUB_CONFIGS``. Each one
+meets on some weekdays within a local time window, and a run counts as a club
+run when it starts inside the club's geofence: a radius around the meeting
+point. Clubs without coordinates, and runs without a start point, fall back
+to matching ``location_city`` and ``location_country``.
+
+Rules are indexed by weekday and by a grid of ``CELL_DEGREES`` cells that
+each geofence overlaps, so a run only checks the clubs meeting that day near
+its start point, however many clubs there are. Both ``Activity`` and ``Run``
+delegate to the shared matcher, and ``classify`` handles a whole batch of runs
+in one pass for reprocessing. Pages look up club slugs and settings on the
+matcher too, so they cost no queries.
+
+The matcher is rebuilt when the ``clubs`` data version changes: at once in
+the process that saved a club, and within ``CLUB_RELOAD_INTERVAL`` seconds in
+every other process.
+"""
+import math
+import os
+import threading
+import time as clock
+from dataclasses import dataclass
+from datetime import datetime, time
+from typing import Iterable, List, Optional, Tuple
+
+from models import db
+from models.club import Club
+from models.data_version import DataVersion
+from services.cache import bump_versions, club_scope
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+CELL_DEGREES = 0.05           # About 5.5 km north-south
+METERS_PER_DEGREE = 111_320
+DEFAULT_RADIUS_M = 1000
+RELOAD_INTERVAL = float(os.environ.get('CLUB_RELOAD_INTERVAL', '30'))  # Seconds
+CLUBS_SCOPE = 'clubs'
+
+
+def slugify(name):
+    """The URL slug templates build for a club name"""
+    return name.lower().replace(' ', '-')
+
+
+def cell(degrees):
+    return math.floor(degrees / CELL_DEGREES)
+
+
+@dataclass(frozen=True)
+class ClubRule:
+    name: str
+    order: int              # Position in the configuration; the first matching club wins
+    start: time
+    end: time
+    city: Optional[str]     # Lower-cased; None matches any city
+    country: Optional[str]  # Lower-cased; None matches any country
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    radius_m: float = DEFAULT_RADIUS_M
+
+    @property
+    def located(self) -> bool:
+        return self.lat is not None and self.lng is not None
+
+    def within(self, lat: float, lng: float) -> bool:
+        # Equirectangular distance is accurate to well under a meter at geofence scale
+        dy = (lat - self.lat) * METERS_PER_DEGREE
+        dx = (lng - self.lng) * METERS_PER_DEGREE * math.cos(math.radians(self.lat))
+        return dx * dx + dy * dy <= self.radius_m * self.radius_m
+
+    def matches(self, run_time: time, city: Optional[str], country: Optional[str],
+                lat: Optional[float] = None, lng: Optional[float] = None) -> bool:
+        if not self.start <= run_time <= self.end:
+            return False
+        if self.located and lat is not None and lng is not None:
+            return self.within(lat, lng)
+        # Location is only checked when both the rule and the run have one
+        if self.city and city and self.city != city.lower():
+            return False
+        if self.country and country and self.country != country.lower():
+            return False
+        return True
+
+
+class ClubMatcher:
+    def __init__(self, configs: dict, version: int = 0):
+        self.version = version
+        self.configs = configs
+        self.names_by_slug = {slugify(name): name for name in configs}
+        self._rules_by_weekday: List[List[ClubRule]] = [[] for _ in WEEKDAYS]
+        self._unlocated_by_weekday: List[List[ClubRule]] = [[] for _ in WEEKDAYS]
+        self._cells = {}  # (weekday, lat cell, lng cell) -> rules, in configuration order
+        for order, (name, config) in enumerate(configs.items()):
+            latlng = config.get('start_latlng') or (None, None)
+            rule = ClubRule(
+                name=name,
+                order=order,
+                start=datetime.strptime(config['time_window']['start'], '%H:%M').time(),
+                end=datetime.strptime(config['time_window']['end'], '%H:%M').time(),
+                city=(config.get('location_city') or '').lower() or None,
+                country=(config.get('location_country') or '').lower() or None,
+                lat=latlng[0],
+                lng=latlng[1],
+                radius_m=config.get('radius_m') or DEFAULT_RADIUS_M,
+            )
+            for day in config['days']:
+                weekday = WEEKDAYS.index(day)
+                self._rules_by_weekday[weekday].append(rule)
+                if rule.located:
+                    for key in self._cells_of(rule):
+                        self._cells.setdefault((weekday, *key), []).append(rule)
+                else:
+                    self._unlocated_by_weekday[weekday].append(rule)
+        # A run in a cell can also match clubs that have no geofence
+        for (weekday, *_), rules in self._cells.items():
+            rules.extend(self._unlocated_by_weekday[weekday])
+            rules.sort(key=lambda rule: rule.order)
+
+    @staticmethod
+    def _cells_of(rule):
+        """Grid cells the rule's geofence overlaps"""
+        dlat = rule.radius_m / METERS_PER_DEGREE
+        dlng = rule.radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(rule.lat)), 1e-6))
+        for i in range(cell(rule.lat - dlat), cell(rule.lat + dlat) + 1):
+            for j in range(cell(rule.lng - dlng), cell(rule.lng + dlng) + 1):
+                yield i, j
+
+    def candidates(self, weekday: int, lat: Optional[float], lng: Optional[float]) -> List[ClubRule]:
+        if lat is None or lng is None:
+            return self._rules_by_weekday[weekday]
+        return self._cells.get((weekday, cell(lat), cell(lng))) or self._unlocated_by_weekday[weekday]
+
+    def match(self, start_date_local: Optional[datetime], location_city: Optional[str] = None,
+              location_country: Optional[str] = None, start_lat: Optional[float] = None,
+              start_lng: Optional[float] = None) -> Optional[str]:
+        """Name of the first club whose rule matches the run, or None"""
+        if start_date_local is None:
+            return None
+        run_time = start_date_local.time()
+        for rule in self.candidates(start_date_local.weekday(), start_lat, start_lng):
+            if rule.matches(run_time, location_city, location_country, start_lat, start_lng):
+                return rule.name
+        return None
+
+    def classify(self, runs: Iterable[Tuple]) -> List[Optional[str]]:
+        """Club names for (start_date_local, location_city, location_country[, start_lat, start_lng]) tuples"""
+        match = self.match
+        return [match(*run) for run in runs]
+
+
+# --- Stored clubs ---
+
+def club_configs() -> dict:
+    """{name: config} of the stored clubs, in the order they were added"""
+    return {club.name: club.to_config() for club in Club.query.order_by(Club.id)}
+
+
+def get_club(name) -> Optional[Club]:
+    return Club.query.filter_by(name=name).first()
+
+
+def clubs_version() -> int:
+    # A column query, so a DataVersion already in the session cannot answer from memory
+    return db.session.query(DataVersion.version).filter_by(scope=CLUBS_SCOPE).scalar() or 0
+
+
+def save_club(name, config):
+    """Create or update a club from a CLUB_CONFIGS-style entry"""
+    club = get_club(name) or Club(name=name)
+    latlng = config.get('start_latlng') or (None, None)
+    club.slug = slugify(name)
+    club.description = config.get('description')
+    club.days = ','.join(config['days'])
+    club.time_start = config['time_window']['start']
+    club.time_end = config['time_window']['end']
+    club.location_city = config.get('location_city')
+    club.location_country = config.get('location_country')
+    club.lat, club.lng = latlng
+    club.radius_m = config.get('radius_m') or DEFAULT_RADIUS_M
+    club.updated_at = datetime.utcnow()
+    db.session.add(club)
+    db.session.commit()
+    bump_versions([CLUBS_SCOPE, club_scope(name)])
+    invalidate_club_matcher()
+    return club
+
+
+def seed_clubs(configs=None):
+    """Add clubs from CLUB_CONFIGS that are not stored yet; returns the names added"""
+    if configs is None:
+        from config import CLUB_CONFIGS as configs
+    existing = {name for (name,) in db.session.query(Club.name)}
+    added = [name for name in configs if name not in existing]
+    for name in added:
+        save_club(name, configs[name])
+    return added
+
+
+# --- Shared matcher ---
+
+_matcher = None
+_checked_at = float('-inf')
+_matcher_lock = threading.Lock()
+
+
+def get_club_matcher() -> ClubMatcher:
+    """The process-wide matcher, rebuilt when the stored clubs change"""
+    global _matcher, _checked_at
+    with _matcher_lock:
+        now = clock.monotonic()
+        if _matcher is None or now - _checked_at >= RELOAD_INTERVAL:
+            version = clubs_version()
+            if _matcher is None or _matcher.version != version:
+                _matcher = ClubMatcher(club_configs(), version)
+            _checked_at = now
+        return _matcher
+
+
+def invalidate_club_matcher():
+    """Make the next get_club_matcher() call check the clubs version"""
+    global _checked_at
+    _checked_at = float('-inf')
@@ -0,0 +1,100 @@
+"""Streaming CSV and NDJSON exports of stored runs.
+
+Rows are read with ``yield_per``, which uses a server-side cursor on
+PostgreSQL and fetches in batches on SQLite, and are encoded in chunks as the
+response is sent. Memory stays flat however many runs are exported, and the
+header goes out before the query has run.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+
+from models import db
+from models.run import Run
+from models.user import User
+
+YIELD_PER = 1000   # Rows fetched from the cursor at a time
+CHUNK_ROWS = 500   # Rows encoded per chunk written to the response
+
+# Bare mimetypes: Flask adds '; charset=utf-8' to text/* itself
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# start_date is UTC, start_date_local the athlete's wall-clock time
+USER_COLUMNS = (
+    Run.strava_activity_id, Run.name, Run.start_date, Run.start_date_local, Run.distance,
+    Run.moving_time, Run.elapsed_time, Run.total_elevation_gain, Run.average_heartrate,
+    Run.max_heartrate, Run.club_name, Run.location_city, Run.location_country,
+    Run.start_lat, Run.start_lng,
+)
+# Other members see what the club pages show, not start points or heart rate
+CLUB_COLUMNS = (
+    User.name.label('runner'), Run.strava_activity_id, Run.name, Run.start_date_local,
+    Run.distance, Run.moving_time, Run.elapsed_time, Run.total_elevation_gain,
+)
+
+
+def user_runs(user_id):
+    """A user's runs, oldest first"""
+    return select(*USER_COLUMNS).where(Run.user_id == user_id).order_by(Run.start_date, Run.id)
+
+
+def club_runs(club_name, start, end):
+    """Every member's runs for a club with start <= start_date_local < end"""
+    return (
+        select(*CLUB_COLUMNS)
+        .join(User, User.id == Run.user_id)
+        .where(Run.club_name == club_name, Run.start_date_local >= start, Run.start_date_local < end)
+        .order_by(Run.start_date_local, Run.id)
+    )
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _rows(statement):
+    result = db.session.execute(statement, execution_options={'yield_per': YIELD_PER})
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def _csv(statement):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.key for column in statement.selected_columns])
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for n, row in enumerate(_rows(statement), 1):
+        writer.writerow([_value(value) for value in row])
+        if n % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson(statement):
+    keys = [column.key for column in statement.selected_columns]
+    lines = []
+    for row in _rows(statement):
+        lines.append(json.dumps(dict(zip(keys, map(_value, row)))))
+        if len(lines) == CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines.clear()
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def stream(statement, fmt):
+    """Chunks of ``statement``'s rows encoded as ``fmt`` (a key of FORMATS)"""
+    return _csv(statement) if fmt == 'csv' else _ndjson(statement)
@@ -0,0 +1,342 @@
+"""Durable, database-backed queue for Strava sync jobs and webhook events.
+
+Jobs live in the ``sync_job`` table, so they survive restarts and can be
+claimed by any number of worker processes sharing the database. A worker
+claims a job with a conditional UPDATE, which is atomic on both SQLite and
+PostgreSQL, and keeps a heartbeat while it runs; jobs whose worker died are
+put back on the queue once the heartbeat goes stale.
+
+A job that finds the Strava budget spent goes back on the queue with a
+``not_before`` time instead of failing.
+
+``flask sync-all`` queues one job per user under a shared batch name and
+runs them on a bounded number of threads. Each job commits on its own, so the
+batch's queued jobs are the checkpoint: an interrupted run resumes with
+``--resume`` and only syncs the users it had not reached or that failed.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.job import SyncJob
+from services.cache import bump_versions, user_scope
+from services.strava import RateLimitExceeded
+
+POLL_INTERVAL = float(os.environ.get('SYNC_POLL_INTERVAL', '2'))
+STALE_AFTER = timedelta(seconds=int(os.environ.get('SYNC_STALE_AFTER', '600')))
+HEARTBEAT_INTERVAL = STALE_AFTER.total_seconds() / 4  # Seconds between heartbeats of a running job
+MAX_ATTEMPTS = 3
+MAX_BACKOFF = 60  # Seconds between retries while the database keeps failing
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def merge_after_date(job, after_date):
+    """Widen a waiting job's range to cover ``after_date`` too; None is an incremental sync"""
+    if job.after_date is None or (after_date is not None and after_date < job.after_date):
+        job.after_date = after_date
+
+
+def queue_sync(user_id, after_date=None, batch=None):
+    """Add a sync for a user to the session, reusing a job that is still waiting.
+
+    ``after_date=None`` asks for an incremental sync from the user's
+    high-water mark; an explicit epoch backfills from that point. A waiting
+    job moves to ``batch`` when one is given, even from an older batch, so a
+    new sync-all covers users an interrupted one left queued.
+    """
+    job = SyncJob.query.filter_by(user_id=user_id, kind='sync', status='queued').first()
+    if job:
+        merge_after_date(job, after_date)
+        if batch is not None:
+            job.batch = batch
+    else:
+        job = SyncJob(user_id=user_id, after_date=after_date, batch=batch)
+        db.session.add(job)
+    return job
+
+
+def commit_queued(queue):
+    """Run ``queue()`` and commit, running it once more if a concurrent enqueue won the race.
+
+    The partial unique index on waiting sync jobs turns a second job for the
+    same user into an IntegrityError; on the second pass ``queue`` finds the
+    other job and reuses it.
+    """
+    try:
+        result = queue()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        result = queue()
+        db.session.commit()
+    return result
+
+
+def enqueue_sync(user_id, after_date=None, batch=None):
+    """Queue a sync for a user (see ``queue_sync``) and commit it"""
+    job = commit_queued(lambda: queue_sync(user_id, after_date, batch))
+    bump_versions([user_scope(user_id)])  # The dashboard shows the sync banner
+    return job
+
+
+def enqueue_activity_event(user_id, event):
+    """Queue a webhook event so the webhook can answer Strava straight away"""
+    job = SyncJob(user_id=user_id, kind='activity', payload=json.dumps(event))
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def latest_job(user_id):
+    """The user's most recent sync, as shown on the dashboard"""
+    return SyncJob.query.filter_by(user_id=user_id, kind='sync').order_by(SyncJob.id.desc()).first()
+
+
+def requeue(job):
+    """Put a job back on the queue, or fold it into a sync already waiting for the same user"""
+    waiting = job.kind == 'sync' and SyncJob.query.filter(
+        SyncJob.id != job.id, SyncJob.user_id == job.user_id, SyncJob.kind == 'sync', SyncJob.status == 'queued'
+    ).first()
+    if not waiting:
+        job.status = 'queued'
+        return
+    merge_after_date(waiting, job.after_date)
+    waiting.batch = job.batch or waiting.batch
+    job.status = 'done'
+    job.message = f'Superseded by job {waiting.id}.'
+    job.finished_at = datetime.utcnow()
+
+
+def requeue_stale_jobs():
+    """Return jobs abandoned by a dead worker to the queue, or fail them"""
+    cutoff = datetime.utcnow() - STALE_AFTER
+    stale = SyncJob.query.filter(SyncJob.status == 'running', SyncJob.heartbeat_at < cutoff).all()
+    for job in stale:
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = 'failed'
+            job.message = 'Sync abandoned after repeated worker failures.'
+            job.finished_at = datetime.utcnow()
+        else:
+            requeue(job)
+    if stale:
+        db.session.commit()
+
+
+def claim_next_job(batch=None):
+    """Atomically move the oldest due queued job, of ``batch`` if given, to running; None if there is none"""
+    while True:
+        now = datetime.utcnow()
+        query = db.session.query(SyncJob.id).filter(
+            SyncJob.status == 'queued', or_(SyncJob.not_before.is_(None), SyncJob.not_before <= now))
+        if batch is not None:
+            query = query.filter_by(batch=batch)
+        job_id = (
+            query
+            .order_by(SyncJob.id)
+            .limit(1)
+            .scalar()
+        )
+        if job_id is None:
+            return None
+        result = db.session.execute(
+            update(SyncJob)
+            .where(SyncJob.id == job_id, SyncJob.status == 'queued')
+            .values(status='running', worker=worker_id(), started_at=now, heartbeat_at=now,
+                    attempts=SyncJob.attempts + 1, not_before=None, message=None)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(SyncJob, job_id)
+        # Another worker won the race for this job; try the next one
+
+
+def has_deferred_jobs(batch=None):
+    """Whether queued jobs, of ``batch`` if given, are held back until the Strava budget allows"""
+    query = SyncJob.query.filter(SyncJob.status == 'queued', SyncJob.not_before.isnot(None))
+    if batch is not None:
+        query = query.filter_by(batch=batch)
+    return db.session.query(query.exists()).scalar()
+
+
+def report_progress(job, **counters):
+    for name, value in counters.items():
+        setattr(job, name, value)
+    job.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+
+
+def keep_alive(app, job_id, finished):
+    """Refresh a running job's heartbeat until ``finished`` is set.
+
+    A sync waiting for the Strava budget may make no progress for a quarter
+    of an hour or more; the heartbeat shows it is still held by a live worker.
+    """
+    while not finished.wait(HEARTBEAT_INTERVAL):
+        with app.app_context():
+            try:
+                db.session.execute(
+                    update(SyncJob)
+                    .where(SyncJob.id == job_id, SyncJob.status == 'running')
+                    .values(heartbeat_at=datetime.utcnow())
+                )
+                db.session.commit()
+            except Exception:
+                traceback.print_exc()
+            finally:
+                db.session.remove()
+
+
+def run_job(job, handler):
+    finished = threading.Event()
+    threading.Thread(target=keep_alive, args=(current_app._get_current_object(), job.id, finished),
+                     name=f'heartbeat-{job.id}', daemon=True).start()
+    try:
+        handler(job)
+        job.status = 'done'
+    except RateLimitExceeded as e:
+        # A spent budget is not the job's fault: it runs again once Strava accepts calls
+        db.session.rollback()
+        job.attempts -= 1
+        job.not_before = datetime.utcnow() + timedelta(seconds=e.retry_after)
+        job.message = str(e)
+        requeue(job)
+    except Exception as e:
+        db.session.rollback()
+        traceback.print_exc()
+        job.status = 'failed'
+        job.message = str(e)
+    finally:
+        finished.set()
+    if job.status != 'queued':
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+    bump_versions([user_scope(job.user_id)])
+
+
+def work(app, handler, stop=None, once=False, batch=None, on_done=None):
+    """Claim and run jobs until ``stop`` is set; ``once`` drains the queue and returns.
+
+    With ``batch`` only that batch's jobs are claimed. Draining waits for jobs
+    held back until the Strava budget allows them, so a batch that spends the
+    budget carries on in the next window. ``on_done(job)`` is
+    called after each job, inside the app context. A database error while
+    claiming is logged and retried after a growing pause, so a locked SQLite
+    file or a dropped connection does not end the worker.
+    """
+    failures = 0
+    while not (stop and stop.is_set()):
+        job = None
+        with app.app_context():
+            try:
+                requeue_stale_jobs()
+                job = claim_next_job(batch)
+                if job:
+                    run_job(job, handler)
+                    if on_done:
+                        on_done(job)
+                failures = 0
+            except Exception:
+                traceback.print_exc()
+                failures += 1
+            finally:
+                db.session.remove()
+        if failures:
+            if once and failures > MAX_ATTEMPTS:
+                raise RuntimeError(f"Worker gave up after {failures} failures in a row")
+            time.sleep(min(MAX_BACKOFF, POLL_INTERVAL * 2 ** failures))
+            continue
+        if job:
+            continue
+        if once:
+            with app.app_context():
+                deferred = has_deferred_jobs(batch)
+                db.session.remove()
+            if not deferred:
+                return
+        time.sleep(POLL_INTERVAL)
+
+
+# --- sync-all batches ---
+
+def new_batch_name():
+    return 'sync-all:' + datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+
+
+def enqueue_batch(user_ids, batch, after_date=None):
+    """Queue a sync for every user under ``batch`` in one transaction"""
+    commit_queued(lambda: [queue_sync(user_id, after_date, batch) for user_id in user_ids])
+    bump_versions([user_scope(user_id) for user_id in user_ids])
+
+
+def latest_batch():
+    # Names embed their start time; jobs taken over by a newer batch keep their old ids
+    return db.session.query(func.max(SyncJob.batch)).scalar()
+
+
+def retry_failed(batch):
+    """Queue the batch's failed syncs again, e.g. users whose sync ran out of Strava budget; returns the count"""
+    failed = SyncJob.query.filter_by(batch=batch, kind='sync', status='failed').order_by(SyncJob.id).all()
+    for job in failed:
+        job.message = None
+        job.finished_at = None
+        job.attempts = 0
+        requeue(job)
+    db.session.commit()
+    return len(failed)
+
+
+def batch_counts(batch):
+    """{status: number of jobs} for a batch"""
+    return dict(
+        db.session.query(SyncJob.status, func.count())
+        .filter_by(batch=batch)
+        .group_by(SyncJob.status)
+        .all()
+    )
+
+
+def run_batch(app, handler, batch, concurrency, on_done=None):
+    """Run a batch's queued jobs on ``concurrency`` threads until none are left.
+
+    On Ctrl-C every thread finishes its current job and returns, leaving the
+    rest queued for a later run. Returns False if it was interrupted.
+    """
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=work, args=(app, handler),
+                         kwargs={'stop': stop, 'once': True, 'batch': batch, 'on_done': on_done},
+                         name=f'sync-all-{i}', daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        # Join with a timeout so the main thread still receives KeyboardInterrupt
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return False
+    return True
+
+
+def start_worker_thread(app, handler):
+    """Run a worker inside the web process, for single-process deployments"""
+    thread = threading.Thread(target=work, args=(app, handler), name='sync-worker', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,117 @@
+"""Materialized monthly club leaderboard.
+
+Rows are keyed by (club, month, user). Whenever a user's runs in some months
+change, those (user, month) slices are deleted and re-aggregated from Run
+with a single INSERT ... SELECT, so club changes and moved dates are covered
+without tracking the previous assignment of each run. Run days come from the
+user's per-club run-day masks, which must be refreshed first.
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, literal, or_, select, update
+
+from models import db
+from models.club_leaderboard import ClubLeaderboard
+from models.run import Run
+from models.user import User
+from services.rundays import club_masks, month_days
+
+
+def month_key(column):
+    """SQL expression for the 'YYYY-MM' of a datetime column"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.to_char(column, 'YYYY-MM')
+    return func.strftime('%Y-%m', column)
+
+
+def month_bounds(month):
+    """[start, end) datetimes of a 'YYYY-MM' month"""
+    year, month_num = map(int, month.split('-'))
+    end = datetime(year + 1, 1, 1) if month_num == 12 else datetime(year, month_num + 1, 1)
+    return datetime(year, month_num, 1), end
+
+
+def months_of(dates):
+    return {d.strftime('%Y-%m') for d in dates if d is not None}
+
+
+def refresh_leaderboard(user_id, months):
+    """Re-aggregate one user's leaderboard rows for the given 'YYYY-MM' months.
+
+    Returns the names of the clubs whose leaderboard was affected.
+    """
+    months = sorted(set(months))
+    if not months:
+        return set()
+    in_slice = (ClubLeaderboard.user_id == user_id) & ClubLeaderboard.month.in_(months)
+    clubs = {club for (club,) in db.session.query(ClubLeaderboard.club_name).filter(in_slice).distinct()}
+    db.session.execute(delete(ClubLeaderboard).where(in_slice))
+    month = month_key(Run.start_date_local)
+    in_months = or_(*(
+        (Run.start_date_local >= start) & (Run.start_date_local < end)
+        for start, end in map(month_bounds, months)
+    ))
+    aggregate = (
+        select(
+            Run.club_name,
+            month,
+            Run.user_id,
+            func.count(Run.id),
+            literal(0),  # run_days, filled in from the masks below
+            func.coalesce(func.sum(Run.distance), 0),
+            func.coalesce(func.sum(Run.moving_time), 0),
+        )
+        .where(Run.user_id == user_id, Run.club_name.isnot(None), in_months)
+        .group_by(Run.club_name, month, Run.user_id)
+    )
+    db.session.execute(
+        insert(ClubLeaderboard).from_select(
+            ['club_name', 'month', 'user_id', 'total_runs', 'run_days', 'distance', 'moving_time'],
+            aggregate
+        )
+    )
+    entries = db.session.query(ClubLeaderboard.club_name, ClubLeaderboard.month).filter(in_slice).all()
+    clubs.update(club for club, _ in entries)
+    if entries:
+        masks = club_masks(user_id, {int(entry_month[:4]) for _, entry_month in entries})
+        run_days = []
+        for club, entry_month in entries:
+            year, month_num = map(int, entry_month.split('-'))
+            run_days.append({'club_name': club, 'month': entry_month, 'user_id': user_id,
+                             'run_days': month_days(masks.get((club, year), 0), year, month_num)})
+        db.session.execute(update(ClubLeaderboard), run_days)
+    db.session.commit()
+    return clubs
+
+
+def rebuild_leaderboard():
+    """Recompute every row, e.g. after the table is first created"""
+    db.session.execute(delete(ClubLeaderboard))
+    month = month_key(Run.start_date_local)
+    for (user_id,) in db.session.query(Run.user_id).filter(Run.club_name.isnot(None)).distinct():
+        months = [
+            value for (value,) in
+            db.session.query(month).filter(Run.user_id == user_id, Run.club_name.isnot(None)).distinct()
+            if value
+        ]
+        refresh_leaderboard(user_id, months)
+    db.session.commit()
+
+
+def club_leaderboard(club_name, year):
+    """(ClubLeaderboard, User) rows of a club for a year, latest month first, ranked within each month"""
+    return (
+        db.session.query(ClubLeaderboard, User)
+        .join(User, ClubLeaderboard.user_id == User.id)
+        .filter(
+            ClubLeaderboard.club_name == club_name,
+            ClubLeaderboard.month >= f'{year}-01',
+            ClubLeaderboard.month <= f'{year}-12',
+        )
+        .order_by(
+            ClubLeaderboard.month.desc(),
+            ClubLeaderboard.run_days.desc(),
+            ClubLeaderboard.distance.desc(),
+        )
+        .all()
+    )
@@ -0,0 +1,207 @@
+"""Request, SQL, Strava and template metrics in Prometheus text format.
+
+``init_app`` times every request per route and hooks SQLAlchemy engine
+events and Flask's template signals; ``StravaClient`` reports each HTTP call
+through ``observe_strava_call``. Metrics live in process memory, so under
+gunicorn every worker exposes its own series on ``/metrics`` (scrape each
+worker or run a single one).
+
+Within a request, statements are also grouped by their SQL text with IN
+lists collapsed; when one shape runs more than ``METRICS_N_PLUS_ONE_THRESHOLD``
+times the request is logged as a likely N+1.
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter as Tally
+
+from flask import (before_render_template, current_app, g, has_request_context, request,
+                   template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('METRICS_N_PLUS_ONE_THRESHOLD', '10'))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            for bound, count in zip(self.buckets, series):
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", _number(bound))])} {count}'
+            yield f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", "+Inf")])} {series[-1]}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-2])}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}'
+
+
+REGISTRY = []
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route',
+                            ('method', 'route', 'status'))
+REQUEST_QUERIES = Histogram('http_request_sql_statements', 'SQL statements issued per request',
+                            ('route',), COUNT_BUCKETS)
+SQL_LATENCY = Histogram('sql_statement_duration_seconds', 'SQL statement time by route',
+                        ('route',), SQL_BUCKETS)
+STRAVA_LATENCY = Histogram('strava_request_duration_seconds', 'Strava API call latency',
+                           ('method', 'endpoint', 'status'))
+RENDER_LATENCY = Histogram('template_render_duration_seconds', 'Jinja template render time',
+                           ('template',))
+N_PLUS_ONE = Counter('sql_n_plus_one_total', 'Requests that repeated one statement shape too often',
+                     ('route',))
+
+BACKGROUND = 'background'  # Route label for work outside a request (sync threads, CLI)
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_ID = re.compile(r'/\d+')
+
+
+def current_route():
+    if not has_request_context():
+        return BACKGROUND
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def statement_shape(statement):
+    """SQL text with whitespace normalised and IN lists collapsed"""
+    return _IN_LIST.sub('(?...)', _WHITESPACE.sub(' ', statement).strip())
+
+
+def observe_strava_call(method, path, status, seconds):
+    STRAVA_LATENCY.observe(seconds, method, _ID.sub('/{id}', path), str(status))
+
+
+def render_metrics():
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+# --- hooks ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_started'].pop()
+    SQL_LATENCY.observe(time.perf_counter() - started, current_route())
+    if has_request_context() and 'metrics_statements' in g:
+        g.metrics_statements[statement_shape(statement)] += 1
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('metrics_started'):
+        conn.info['metrics_started'].pop()
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('metrics_renders', []).append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    if has_request_context() and g.get('metrics_renders'):
+        RENDER_LATENCY.observe(time.perf_counter() - g.metrics_renders.pop(), template.name or 'string')
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_statements = Tally()
+
+
+def _after_request(response):
+    if 'metrics_started' not in g:
+        return response
+    route = current_route()
+    REQUEST_LATENCY.observe(time.perf_counter() - g.metrics_started,
+                            request.method, route, str(response.status_code))
+    statements = g.metrics_statements
+    REQUEST_QUERIES.observe(sum(statements.values()), route)
+    if statements:
+        shape, repeats = statements.most_common(1)[0]
+        if repeats > N_PLUS_ONE_THRESHOLD:
+            N_PLUS_ONE.inc(route)
+            current_app.logger.warning('Possible N+1 on %s %s: %d x %s',
+                                       request.method, route, repeats, shape[:200])
+    return response
+
+
+_engine_hooked = False
+
+
+def init_app(app):
+    """Time requests and templates for ``app`` and SQL for every engine"""
+    global _engine_hooked
+    if not _engine_hooked:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _engine_hooked = True
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
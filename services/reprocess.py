@@ -0,0 +1,87 @@
+"""Reclassify stored runs after the club definitions change.
+
+Runs are walked in keyset-paginated chunks by id, reading only the columns
+club detection needs, and each chunk is classified in one pass. Only runs
+whose club changed are written; each user's changes are committed together
+with the run-day and leaderboard slices they touch, so stopping half-way
+leaves consistent data and a rerun only finds what is still left.
+
+The walk can be split over processes by ``user_id % partitions``: a user's
+runs, and therefore their aggregate rows, belong to exactly one partition.
+"""
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from sqlalchemy import update
+
+from models import db
+from models.run import Run
+from services.cache import bump_versions, club_scope, user_scope
+from services.clubs import get_club_matcher
+from services.leaderboard import months_of, refresh_leaderboard
+from services.rundays import refresh_run_days, years_of
+
+CHUNK_SIZE = 2000
+
+
+@dataclass
+class Progress:
+    checked: int = 0
+    changed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Runs checked per second"""
+        return self.checked / self.seconds if self.seconds else 0.0
+
+
+def reprocess_chunk(rows, matcher):
+    """Write the runs in ``rows`` whose club changed; returns how many did"""
+    new_clubs = matcher.classify(row[3:] for row in rows)
+    changed_by_user = defaultdict(list)
+    for row, new_club in zip(rows, new_clubs):
+        if row.club_name != new_club:
+            changed_by_user[row.user_id].append((row, new_club))
+    scopes = []
+    for user_id, changed in changed_by_user.items():
+        db.session.execute(update(Run), [{'id': row.id, 'club_name': new_club} for row, new_club in changed])
+        dates = [row.start_date_local for row, _ in changed]
+        refresh_run_days(user_id, years_of(dates))
+        clubs = refresh_leaderboard(user_id, months_of(dates))  # Commits this user's changes
+        scopes += [user_scope(user_id)] + [club_scope(club) for club in clubs]
+    db.session.commit()
+    bump_versions(scopes)
+    return sum(len(changed) for changed in changed_by_user.values())
+
+
+def reprocess_clubs(user_id=None, partition=0, partitions=1, chunk_size=CHUNK_SIZE, on_chunk=None):
+    """Re-run club detection over stored runs: one user's, or every run in a partition.
+
+    ``on_chunk(progress)`` is called after each committed chunk. Returns the
+    final Progress.
+    """
+    matcher = get_club_matcher()
+    query = db.session.query(Run.id, Run.user_id, Run.club_name, Run.start_date_local, Run.location_city,
+                             Run.location_country, Run.start_lat, Run.start_lng)
+    if user_id is not None:
+        query = query.filter(Run.user_id == user_id)
+    if partitions > 1:
+        query = query.filter(Run.user_id % partitions == partition)
+
+    progress = Progress()
+    started = time.perf_counter()
+    last_id = 0
+    while True:
+        rows = query.filter(Run.id > last_id).order_by(Run.id).limit(chunk_size).all()
+        if not rows:
+            break
+        progress.changed += reprocess_chunk(rows, matcher)
+        progress.checked += len(rows)
+        progress.seconds = time.perf_counter() - started
+        last_id = rows[-1].id
+        if on_chunk:
+            on_chunk(progress)
+    db.session.commit()
+    return progress
@@ -0,0 +1,167 @@
+"""Per-user daily rollups and the range, rolling and year-over-year queries on them.
+
+One ``daily_rollup`` row holds a user's run count, distance, moving time and
+elevation for a local day, so ten years of history is at most ~3,650 small
+rows however many activities it contains. Days touched by an ingest are
+deleted and re-aggregated from Run with an INSERT ... SELECT per year.
+Rolling windows are answered from prefix sums over a dense day array, and
+year-over-year comparisons are summed per year in SQL.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import case, delete, func, insert, select
+
+from models import db
+from models.daily_rollup import DailyRollup
+from models.run import Run
+
+ROLLING_WINDOWS = (7, 30, 365)
+
+Totals = namedtuple('Totals', ['runs', 'distance', 'moving_time', 'elevation_gain'])
+EMPTY = Totals(0, 0, 0, 0)
+
+
+def day_key(column):
+    """SQL expression for the 'YYYY-MM-DD' of a datetime column"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.to_char(column, 'YYYY-MM-DD')
+    return func.strftime('%Y-%m-%d', column)
+
+
+def refresh_daily_rollups(user_id, dates):
+    """Re-aggregate the user's rollup rows for the local days of ``dates``"""
+    days_by_year = {}
+    for value in dates:
+        if value is not None:
+            days_by_year.setdefault(value.year, set()).add(value.strftime('%Y-%m-%d'))
+    day = day_key(Run.start_date_local)
+    for year, days in sorted(days_by_year.items()):
+        days = sorted(days)
+        db.session.execute(delete(DailyRollup).where(DailyRollup.user_id == user_id, DailyRollup.day.in_(days)))
+        aggregate = (
+            select(
+                Run.user_id,
+                day,
+                func.count(Run.id),
+                func.coalesce(func.sum(Run.distance), 0),
+                func.coalesce(func.sum(Run.moving_time), 0),
+                func.coalesce(func.sum(Run.total_elevation_gain), 0),
+            )
+            .where(
+                Run.user_id == user_id,
+                Run.start_date_local >= datetime(year, 1, 1),
+                Run.start_date_local < datetime(year + 1, 1, 1),
+                day.in_(days),
+            )
+            .group_by(Run.user_id, day)
+        )
+        db.session.execute(
+            insert(DailyRollup).from_select(
+                ['user_id', 'day', 'runs', 'distance', 'moving_time', 'elevation_gain'], aggregate
+            )
+        )
+    db.session.commit()
+
+
+def rebuild_daily_rollups():
+    """Recompute every row, e.g. after the table is first created"""
+    db.session.execute(delete(DailyRollup))
+    for (user_id,) in db.session.query(Run.user_id).distinct():
+        dates = [start for (start,) in db.session.query(Run.start_date_local).filter(Run.user_id == user_id)]
+        refresh_daily_rollups(user_id, dates)
+    db.session.commit()
+
+
+def _bounds(start, end):
+    """Rollup rows of days in [start, end]; either bound may be None"""
+    criteria = []
+    if start is not None:
+        criteria.append(DailyRollup.day >= start.isoformat())
+    if end is not None:
+        criteria.append(DailyRollup.day <= end.isoformat())
+    return criteria
+
+
+def daily_totals(user_id, start=None, end=None):
+    """[(date, Totals)] for the days in [start, end] the user ran on"""
+    rows = (
+        db.session.query(DailyRollup.day, DailyRollup.runs, DailyRollup.distance,
+                         DailyRollup.moving_time, DailyRollup.elevation_gain)
+        .filter(DailyRollup.user_id == user_id, *_bounds(start, end))
+        .order_by(DailyRollup.day)
+    )
+    return [(date.fromisoformat(day), Totals(*values)) for day, *values in rows]
+
+
+def range_totals(user_id, start=None, end=None):
+    """Totals over the days in [start, end]"""
+    return Totals(*db.session.query(
+        func.coalesce(func.sum(DailyRollup.runs), 0),
+        func.coalesce(func.sum(DailyRollup.distance), 0),
+        func.coalesce(func.sum(DailyRollup.moving_time), 0),
+        func.coalesce(func.sum(DailyRollup.elevation_gain), 0),
+    ).filter(DailyRollup.user_id == user_id, *_bounds(start, end)).one())
+
+
+class PrefixSums:
+    """Cumulative totals over a dense day range, for O(1) totals of any window inside it"""
+
+    def __init__(self, start, end, days):
+        self.start = start
+        size = (end - start).days + 1
+        columns = [[0] * size for _ in Totals._fields]
+        for day, totals in days:
+            offset = (day - start).days
+            if 0 <= offset < size:
+                for column, value in zip(columns, totals):
+                    column[offset] = value
+        # Index i holds the sum of days [start, start + i)
+        self.sums = [[0, *accumulate(column)] for column in columns]
+
+    @classmethod
+    def load(cls, user_id, start, end):
+        return cls(start, end, daily_totals(user_id, start, end))
+
+    def total(self, first, last):
+        """Totals over [first, last], clipped to the loaded range"""
+        size = len(self.sums[0]) - 1
+        lo = min(max((first - self.start).days, 0), size)
+        hi = min(max((last - self.start).days + 1, 0), size)
+        if hi <= lo:
+            return EMPTY
+        return Totals(*(column[hi] - column[lo] for column in self.sums))
+
+
+def rolling_totals(user_id, windows=ROLLING_WINDOWS, today=None):
+    """{days: Totals} for the trailing windows ending today"""
+    today = today or datetime.utcnow().date()
+    sums = PrefixSums.load(user_id, today - timedelta(days=max(windows) - 1), today)
+    return {days: sums.total(today - timedelta(days=days - 1), today) for days in windows}
+
+
+def year_over_year(user_id, today=None):
+    """[(year, full-year Totals, Totals up to today's day of the year)], newest year first.
+
+    Summed per year in SQL, so the read is one row per year of history. Days
+    compare as 'MM-DD', which puts Feb 29 against Feb 28 in other years.
+    """
+    today = today or datetime.utcnow().date()
+    year = func.substr(DailyRollup.day, 1, 4)
+    to_date = func.substr(DailyRollup.day, 6) <= today.strftime('%m-%d')
+    columns = (DailyRollup.runs, DailyRollup.distance, DailyRollup.moving_time, DailyRollup.elevation_gain)
+    rows = (
+        db.session.query(
+            year,
+            *(func.sum(column) for column in columns),
+            *(func.sum(case((to_date, column), else_=0)) for column in columns),
+        )
+        .filter(DailyRollup.user_id == user_id, DailyRollup.day <= date(today.year, 12, 31).isoformat())
+        .group_by(year)
+        .all()
+    )
+    if not rows:
+        return []
+    totals = {int(row[0]): (Totals(*row[1:5]), Totals(*row[5:9])) for row in rows}
+    return [(year, *totals.get(year, (EMPTY, EMPTY))) for year in range(today.year, min(totals) - 1, -1)]
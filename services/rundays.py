@@ -0,0 +1,187 @@
+"""Per-user run-day index: one 366-bit set per (user, year, club).
+
+A bit is set for each local date the user ran on, in the '' row for all runs
+and in a row per club for club runs. Rows for the years touched by an ingest
+are rebuilt from Run with one DISTINCT query. Streaks, day counts, the
+heatmap and the leaderboard's run days are then bit operations on Python
+ints rather than scans over sorted dates.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, func, insert
+
+from models import db
+from models.run import Run
+from models.run_calendar import RunCalendar
+
+YEAR_BYTES = 46  # 366 bits
+ALL_RUNS = ''
+
+
+def as_date(value):
+    """func.date() yields a date on PostgreSQL and an ISO string on SQLite"""
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def day_of_year(day):
+    return day.timetuple().tm_yday - 1
+
+
+def encode(mask):
+    return mask.to_bytes(YEAR_BYTES, 'little')
+
+
+def decode(days):
+    return int.from_bytes(days, 'little')
+
+
+def years_of(dates):
+    return {d.year for d in dates if d is not None}
+
+
+def month_days(mask, year, month):
+    """Number of days run in one month of a year's mask"""
+    start = day_of_year(date(year, month, 1))
+    end = day_of_year(date(year, 12, 31)) + 1 if month == 12 else day_of_year(date(year, month + 1, 1))
+    return ((mask >> start) & ((1 << (end - start)) - 1)).bit_count()
+
+
+def refresh_run_days(user_id, years):
+    """Rebuild the user's masks for the given years from Run"""
+    years = sorted(set(years))
+    if not years:
+        return
+    in_years = (RunCalendar.user_id == user_id) & RunCalendar.year.in_(years)
+    db.session.execute(delete(RunCalendar).where(in_years))
+
+    day = func.date(Run.start_date_local)
+    rows = (
+        db.session.query(day, Run.club_name)
+        .filter(
+            Run.user_id == user_id,
+            Run.start_date_local >= datetime(years[0], 1, 1),
+            Run.start_date_local < datetime(years[-1] + 1, 1, 1),
+        )
+        .distinct()
+    )
+    masks = {}
+    for value, club_name in rows:
+        run_date = as_date(value)
+        if run_date.year not in years:
+            continue
+        bit = 1 << day_of_year(run_date)
+        masks[run_date.year, ALL_RUNS] = masks.get((run_date.year, ALL_RUNS), 0) | bit
+        if club_name:
+            masks[run_date.year, club_name] = masks.get((run_date.year, club_name), 0) | bit
+    if masks:
+        db.session.execute(insert(RunCalendar), [
+            {'user_id': user_id, 'year': year, 'club_name': club_name, 'days': encode(mask)}
+            for (year, club_name), mask in masks.items()
+        ])
+    db.session.commit()
+
+
+def rebuild_run_days():
+    """Recompute every mask, e.g. after the table is first created"""
+    db.session.execute(delete(RunCalendar))
+    year = func.extract('year', Run.start_date_local)
+    for (user_id,) in db.session.query(Run.user_id).distinct():
+        years = [int(value) for (value,) in
+                 db.session.query(year).filter(Run.user_id == user_id).distinct() if value]
+        refresh_run_days(user_id, years)
+    db.session.commit()
+
+
+def load_masks(user_ids, club_name=ALL_RUNS, years=None):
+    """{user_id: {year: mask}} for the given users"""
+    query = db.session.query(RunCalendar).filter(
+        RunCalendar.user_id.in_(user_ids), RunCalendar.club_name == club_name
+    )
+    if years is not None:
+        query = query.filter(RunCalendar.year.in_(years))
+    masks = {}
+    for row in query:
+        masks.setdefault(row.user_id, {})[row.year] = decode(row.days)
+    return masks
+
+
+def club_masks(user_id, years):
+    """{(club_name, year): mask} of the user's club runs in the given years"""
+    rows = db.session.query(RunCalendar).filter(
+        RunCalendar.user_id == user_id, RunCalendar.year.in_(years), RunCalendar.club_name != ALL_RUNS
+    )
+    return {(row.club_name, row.year): decode(row.days) for row in rows}
+
+
+def longest_run(bits):
+    """Length of the longest run of consecutive set bits"""
+    length = 0
+    while bits:
+        bits &= bits >> 1
+        length += 1
+    return length
+
+
+def run_ending_at(bits, index):
+    """Length of the run of set bits ending at ``index``"""
+    if index < 0 or not bits >> index & 1:
+        return 0
+    gaps = ~bits & ((1 << (index + 1)) - 1)
+    return index + 1 - gaps.bit_length()
+
+
+class RunDays:
+    """A user's run days across years as one bitset starting on a Monday"""
+
+    def __init__(self, masks):
+        self.masks = masks
+        first_year = min(masks) if masks else datetime.utcnow().year
+        first = date(first_year, 1, 1)
+        self.start = first - timedelta(days=first.weekday())
+        self.bits = 0
+        for year, mask in masks.items():
+            self.bits |= mask << (date(year, 1, 1) - self.start).days
+
+    @classmethod
+    def load(cls, user_id, club_name=ALL_RUNS):
+        return cls(load_masks([user_id], club_name).get(user_id, {}))
+
+    def index(self, day):
+        return (day - self.start).days
+
+    @property
+    def count(self):
+        return self.bits.bit_count()
+
+    def longest_streak(self):
+        return longest_run(self.bits)
+
+    def current_streak(self, today=None):
+        """Consecutive days up to today, or up to yesterday if today has no run yet"""
+        today = self.index(today or datetime.utcnow().date())
+        return run_ending_at(self.bits, today) or run_ending_at(self.bits, today - 1)
+
+    def weeks(self, today=None):
+        """Bitset of Monday-to-Sunday weeks with at least one run, up to today's week"""
+        today = self.index(today or datetime.utcnow().date())
+        if today < 0:
+            return 0, -1
+        last_week = today // 7
+        bits = self.bits & ((1 << (today + 1)) - 1)
+        weeks = 0
+        for week in range(last_week + 1):
+            if bits >> (week * 7) & 0x7F:
+                weeks |= 1 << week
+        return weeks, last_week
+
+    def weekly_streaks(self, today=None):
+        """(longest, current) number of consecutive weeks with a run"""
+        weeks, this_week = self.weeks(today)
+        current = run_ending_at(weeks, this_week) or run_ending_at(weeks, this_week - 1)
+        return longest_run(weeks), current
+
+    def heatmap(self, year):
+        """ISO dates run in a year, for the calendar heatmap"""
+        mask = self.masks.get(year, 0)
+        first = date(year, 1, 1)
+        return [(first + timedelta(days=n)).isoformat() for n in range(mask.bit_length()) if mask >> n & 1]
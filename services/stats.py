@@ -0,0 +1,48 @@
+"""Per-user running statistics computed in SQL and kept in the user_stats table."""
+from datetime import date, datetime
+
+import pytz
+from sqlalchemy import func
+
+from models import db
+from models.run import Run
+from models.user_stats import UserStats
+from services.rollups import range_totals
+from services.rundays import RunDays
+
+
+def refresh_user_stats(user_id, year=None):
+    """Recompute a user's aggregates with SQL and store them in user_stats"""
+    year = year or datetime.now(pytz.UTC).year
+    stats = db.session.get(UserStats, user_id) or UserStats(user_id=user_id)
+
+    # Run-day masks and daily rollups are refreshed before stats, see refresh_run_aggregates
+    stats.total_runs, stats.total_distance, stats.total_moving_time, _ = range_totals(user_id)
+    longest = (
+        db.session.query(Run.distance, Run.name)
+        .filter(Run.user_id == user_id)
+        .order_by(func.coalesce(Run.distance, 0).desc(), Run.id)
+        .first()
+    )
+    stats.longest_distance, stats.longest_run_name = (longest[0] or 0, longest[1]) if longest else (0, None)
+
+    days = RunDays.load(user_id)
+    stats.total_days_running = days.count
+    stats.longest_streak = days.longest_streak()
+
+    stats.year = year
+    stats.year_runs, stats.year_distance, stats.year_moving_time, _ = range_totals(
+        user_id, date(year, 1, 1), date(year, 12, 31)
+    )
+    stats.updated_at = datetime.utcnow()
+    db.session.add(stats)
+    db.session.commit()
+    return stats
+
+
+def get_user_stats(user_id):
+    """The user's stats row, recomputed first if missing or from a past year"""
+    stats = db.session.get(UserStats, user_id)
+    if stats is None or stats.year != datetime.now(pytz.UTC).year:
+        stats = refresh_user_stats(user_id)
+    return stats
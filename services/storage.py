@@ -0,0 +1,65 @@
+"""Database helpers shared by the services.
+
+``dialect_insert`` picks the INSERT construct with ON CONFLICT support for
+the database in use, for upserts that run as one statement. ``LocalSQLite``
+holds a connection per thread to a SQLite file on the local disk; the
+response cache and the Strava rate limiter keep state there that every
+process on the host shares.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from models import db
+
+
+def dialect_insert(model, dialect=None):
+    """``insert(model)`` with ON CONFLICT support, or None when the dialect has none.
+
+    ``dialect`` defaults to that of the session's database.
+    """
+    if dialect is None:
+        dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
+
+
+class LocalSQLite:
+    """A SQLite file in WAL mode with one autocommit connection per thread; transactions are explicit"""
+
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self.connection().execute('PRAGMA journal_mode=WAL')
+
+    def connection(self):
+        # sqlite3 connections cannot be shared across threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                                                  isolation_level=None)
+            connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """Yield the thread's connection inside BEGIN IMMEDIATE, committing on success.
+
+        The write lock is taken up front, so concurrent writers wait for it
+        instead of failing when a read would have to turn into a write.
+        """
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+            connection.execute('COMMIT')
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
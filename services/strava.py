@@ -0,0 +1,236 @@
+"""Strava API client with connection pooling, retries and a shared rate limiter.
+
+All Strava traffic goes through one ``StravaClient`` per process. It keeps
+connections alive in a pooled ``requests.Session``, applies timeouts, retries
+connection errors, 429s and 5xx responses with jittered exponential backoff,
+and counts every call against a limiter first. The limiter keeps the calls made
+in the current quarter hour and UTC day, Strava's own windows, in a local
+SQLite file, so every gunicorn and worker process on the host draws from the
+same budget and waits for the next window once either limit is reached. It is
+also fed Strava's ``X-RateLimit-Usage``/``X-RateLimit-Limit`` headers and
+stops issuing calls until the 15-minute window or the day rolls over once a
+quota is spent.
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import STRAVA_CLIENT_ID, STRAVA_CLIENT_SECRET
+from services.metrics import observe_strava_call
+from services.storage import LocalSQLite
+
+STRAVA_URL = os.environ.get('STRAVA_URL', 'https://www.strava.com')
+LIMITER_PATH = os.environ.get('STRAVA_LIMITER_PATH', os.path.join(tempfile.gettempdir(), 'strava-board-ratelimit.sqlite3'))
+SHORT_LIMIT = int(os.environ.get('STRAVA_SHORT_LIMIT', '100'))    # Requests per 15 minutes
+DAILY_LIMIT = int(os.environ.get('STRAVA_DAILY_LIMIT', '1000'))   # Requests per day
+MAX_THROTTLE_WAIT = float(os.environ.get('STRAVA_MAX_THROTTLE_WAIT', '60'))  # Seconds
+SHORT_WINDOW = 15 * 60
+DAY = 24 * 60 * 60
+# Seconds a background sync may wait for the budget: long enough for the quarter hour and the day to roll over
+BACKGROUND_MAX_WAIT = float(os.environ.get('STRAVA_BACKGROUND_MAX_WAIT', str(DAY + SHORT_WINDOW)))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class StravaError(Exception):
+    """Raised when Strava cannot be reached or keeps failing"""
+
+
+class RateLimitExceeded(StravaError):
+    """Raised when the shared budget would make a caller wait longer than allowed"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds until the next call may be made
+
+
+def parse_rate_limit_header(value):
+    """'600,30000' -> (600, 30000); None for a missing or malformed header"""
+    try:
+        short, daily = (int(part) for part in value.split(',')[:2])
+        return short, daily
+    except (AttributeError, ValueError):
+        return None
+
+
+def window_index(timestamp, length):
+    """Number of the fixed window holding timestamp; epoch-aligned, so quarter hours and UTC days line up with Strava's"""
+    return int(timestamp // length)
+
+
+class SharedRateLimiter:
+    """Call counts per short window and per UTC day, persisted in SQLite so all processes on the host share one budget"""
+
+    def __init__(self, path=LIMITER_PATH, short_limit=SHORT_LIMIT, daily_limit=DAILY_LIMIT, window=SHORT_WINDOW):
+        self.path = path
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.window = window
+        self.store = LocalSQLite(path, timeout=30)
+        with self.store.transaction() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS usage '
+                '(id INTEGER PRIMARY KEY CHECK (id = 1), short_window INTEGER NOT NULL, short_count INTEGER NOT NULL, '
+                ' day INTEGER NOT NULL, daily_count INTEGER NOT NULL, blocked_until REAL NOT NULL DEFAULT 0)'
+            )
+            connection.execute('INSERT OR IGNORE INTO usage (id, short_window, short_count, day, daily_count) '
+                               'VALUES (1, 0, 0, 0, 0)')
+
+    def _take(self):
+        """Count a call if both windows have room; otherwise return the seconds until one does"""
+        with self.store.transaction() as connection:
+            short_window, short_count, day, daily_count, blocked_until = connection.execute(
+                'SELECT short_window, short_count, day, daily_count, blocked_until FROM usage WHERE id = 1').fetchone()
+            now = time.time()
+            current_window, today = window_index(now, self.window), window_index(now, DAY)
+            if short_window != current_window:
+                short_window, short_count = current_window, 0
+            if day != today:
+                day, daily_count = today, 0
+            if blocked_until > now:
+                wait = blocked_until - now
+            elif daily_count >= self.daily_limit:
+                wait = (today + 1) * DAY - now
+            elif short_count >= self.short_limit:
+                wait = (current_window + 1) * self.window - now
+            else:
+                short_count += 1
+                daily_count += 1
+                wait = 0
+            connection.execute('UPDATE usage SET short_window = ?, short_count = ?, day = ?, daily_count = ? '
+                               'WHERE id = 1', (short_window, short_count, day, daily_count))
+            return wait
+
+    def acquire(self, max_wait=MAX_THROTTLE_WAIT):
+        deadline = time.time() + max_wait
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            if time.time() + wait > deadline:
+                raise RateLimitExceeded(f"Strava rate limit reached; next request allowed in {wait:.0f}s", wait)
+            time.sleep(wait)
+
+    def block_until(self, timestamp):
+        self.store.connection().execute('UPDATE usage SET blocked_until = MAX(blocked_until, ?) WHERE id = 1', (timestamp,))
+
+    def observe(self, headers):
+        """Stop issuing calls when Strava reports a spent quota"""
+        usage = parse_rate_limit_header(headers.get('X-RateLimit-Usage'))
+        limit = parse_rate_limit_header(headers.get('X-RateLimit-Limit'))
+        if not usage or not limit:
+            return
+        # Strava's short windows start on the quarter hour and its days at midnight UTC
+        now = time.time()
+        if usage[1] >= limit[1]:
+            self.block_until((window_index(now, DAY) + 1) * DAY)
+        elif usage[0] >= limit[0]:
+            self.block_until((window_index(now, SHORT_WINDOW) + 1) * SHORT_WINDOW)
+
+
+class StravaClient:
+    def __init__(self, base_url=STRAVA_URL, limiter=None, timeout=(5, 30), max_retries=4,
+                 backoff=0.5, max_backoff=30, pool_size=16):
+        self.base_url = base_url.rstrip('/')
+        self.limiter = limiter if limiter is not None else SharedRateLimiter()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _sleep_before_retry(self, attempt, response=None):
+        retry_after = response is not None and response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            delay = int(retry_after)
+        else:
+            # Full jitter keeps concurrent workers from retrying in lockstep
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        time.sleep(delay)
+
+    def request(self, method, path, access_token=None, max_wait=MAX_THROTTLE_WAIT, **kwargs):
+        """Send a request, retrying transient failures; returns the final response.
+
+        Waits up to ``max_wait`` seconds for the rate limit before each attempt.
+        The default suits a user waiting on a page; background syncs pass
+        ``BACKGROUND_MAX_WAIT`` and throttle themselves instead of failing.
+        """
+        headers = kwargs.pop('headers', {})
+        if access_token:
+            headers['Authorization'] = f'Bearer {access_token}'
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(max_wait)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, self.base_url + path, headers=headers,
+                                                timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                observe_strava_call(method, path, 'error', time.perf_counter() - started)
+                if attempt == self.max_retries:
+                    raise StravaError(f"Strava request failed: {e}") from e
+                self._sleep_before_retry(attempt)
+                continue
+            observe_strava_call(method, path, response.status_code, time.perf_counter() - started)
+            self.limiter.observe(response.headers)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            self._sleep_before_retry(attempt, response)
+
+    # --- OAuth ---
+
+    def exchange_code(self, code):
+        return self.request('POST', '/oauth/token', data={
+            'client_id': STRAVA_CLIENT_ID,
+            'client_secret': STRAVA_CLIENT_SECRET,
+            'code': code,
+            'grant_type': 'authorization_code'
+        })
+
+    def refresh_token(self, refresh_token):
+        return self.request('POST', '/oauth/token', data={
+            'client_id': STRAVA_CLIENT_ID,
+            'client_secret': STRAVA_CLIENT_SECRET,
+            'refresh_token': refresh_token,
+            'grant_type': 'refresh_token'
+        })
+
+    def create_push_subscription(self, callback_url, verify_token):
+        return self.request('POST', '/api/v3/push_subscriptions', data={
+            'client_id': STRAVA_CLIENT_ID,
+            'client_secret': STRAVA_CLIENT_SECRET,
+            'callback_url': callback_url,
+            'verify_token': verify_token
+        })
+
+    # --- API ---
+
+    def get_athlete(self, access_token):
+        return self.request('GET', '/api/v3/athlete', access_token)
+
+    def list_activities(self, access_token, max_wait=MAX_THROTTLE_WAIT, **params):
+        return self.request('GET', '/api/v3/athlete/activities', access_token, max_wait, params=params)
+
+    def get_activity(self, access_token, activity_id, max_wait=MAX_THROTTLE_WAIT):
+        return self.request('GET', f'/api/v3/activities/{activity_id}', access_token, max_wait)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client; its session is shared by the import threads"""
+    global _client
+    if _client is None:
+        # Fetch threads may ask at once; only one of them builds the session and its pool
+        with _client_lock:
+            if _client is None:
+                _client = StravaClient()
+    return _client
@@ -0,0 +1,389 @@
+"""Import runs from Strava and keep everything derived from them current.
+
+Syncs and webhook events are queued as jobs (``services/jobs.py``) and run
+by ``handle_job`` in a worker: activities are fetched a page at a time,
+upserted in bulk with their compressed payloads, and the run days, rollups,
+stats and leaderboard slices they touch are refreshed before the cache
+versions are bumped.
+"""
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import pytz
+from flask import has_request_context, session
+from sqlalchemy import delete, or_, select
+
+from models import db
+from models.activity import Activity, parse_strava_timestamp
+from models.run import Run
+from models.run_payload import RunPayload, payload_digest, payload_json, payload_row
+from models.sync_state import SyncState
+from models.user import User
+from services.cache import bump_versions, club_scope, user_scope
+from services.jobs import report_progress
+from services.leaderboard import months_of, refresh_leaderboard
+from services.rollups import refresh_daily_rollups
+from services.rundays import refresh_run_days, years_of
+from services.stats import refresh_user_stats
+from services.storage import dialect_insert
+from services.strava import BACKGROUND_MAX_WAIT, RateLimitExceeded, StravaError, get_client
+from services.tokens import get_access_token
+
+STRAVA_FIRST_YEAR = 2009  # No Strava activity predates the service itself
+ACTIVITIES_PER_PAGE = 200  # Maximum page size accepted by Strava
+FETCH_MAX_WORKERS = int(os.environ.get('STRAVA_FETCH_WORKERS', '4'))
+# Incremental syncs re-read this far behind the newest stored start, for activities uploaded late
+SYNC_LOOKBACK = timedelta(days=int(os.environ.get('SYNC_LOOKBACK_DAYS', '3')))
+LOOKUP_BATCH_SIZE = 500  # Ids per IN list when looking up stored runs
+# A stored run is only rewritten, and its aggregates refreshed, when one of these changes;
+# kudos and the like only rewrite the payload
+RUN_UPSERT_COLUMNS = ('user_id', 'name', 'start_date', 'start_date_local', 'distance',
+                      'moving_time', 'club_name', 'location_city', 'location_country',
+                      'start_lat', 'start_lng', 'elapsed_time', 'total_elevation_gain',
+                      'average_heartrate', 'max_heartrate')
+
+
+def refresh_access_token(user):
+    """A valid access token for the user, refreshed at most once across processes"""
+    try:
+        access_token = get_access_token(user)
+    except RateLimitExceeded:
+        raise  # The job goes back on the queue until the budget allows the refresh
+    except Exception as e:
+        print(f"Error refreshing token: {e}")
+        return None
+    # Update session when refreshing on behalf of the logged-in user
+    if access_token and has_request_context() and session.get('user_id') == user.id:
+        session['access_token'] = access_token
+    return access_token
+
+
+def get_current_year():
+    return datetime.now(pytz.UTC).year
+
+
+def get_after_date(year):
+    return int(datetime(year, 1, 1, tzinfo=pytz.UTC).timestamp())
+
+
+class StravaFetchError(StravaError):
+    """Raised when Strava refuses or fails an activities request"""
+
+
+def split_date_range(after_date, before_date=None):
+    """Split an epoch range into calendar-year windows [after, before)"""
+    start = max(after_date, get_after_date(STRAVA_FIRST_YEAR))
+    end = before_date if before_date is not None else int(datetime.now(pytz.UTC).timestamp())
+    windows = []
+    while start < end:
+        next_year = datetime.fromtimestamp(start, pytz.UTC).year + 1
+        window_end = min(get_after_date(next_year), end)
+        windows.append((start, window_end))
+        start = window_end
+    return windows
+
+
+def fetch_activity_page(access_token, after_date, before_date, page, per_page=ACTIVITIES_PER_PAGE):
+    """Fetch a single page of activities between two epoch timestamps"""
+    res = get_client().list_activities(
+        access_token, max_wait=BACKGROUND_MAX_WAIT, after=after_date, before=before_date, page=page,
+        per_page=per_page
+    )
+    if res.status_code != 200:
+        raise StravaFetchError(f"Strava returned {res.status_code} for page {page}: {res.text}")
+    return res.json()
+
+
+def fetch_activities(access_token, after_date, before_date=None, max_workers=FETCH_MAX_WORKERS):
+    """Yield pages of activities between two epoch timestamps as they arrive.
+
+    The range is split into calendar years which are fetched concurrently by a
+    bounded thread pool; pages within one year are requested sequentially until
+    Strava returns a short page. At most ``max_workers`` pages are in flight, so
+    memory stays flat however long the history is.
+    """
+    windows = deque(split_date_range(after_date, before_date))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = {}
+
+    def submit(window, page):
+        future = executor.submit(fetch_activity_page, access_token, window[0], window[1], page)
+        in_flight[future] = (window, page)
+
+    try:
+        while windows and len(in_flight) < max_workers:
+            submit(windows.popleft(), 1)
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                window, page = in_flight.pop(future)
+                activities = future.result()
+                if len(activities) == ACTIVITIES_PER_PAGE:
+                    submit(window, page + 1)
+                elif windows:
+                    submit(windows.popleft(), 1)
+                if activities:
+                    yield activities
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def page_hash(activities):
+    return hashlib.sha1(json.dumps(activities, sort_keys=True).encode()).hexdigest()
+
+
+def get_sync_state(user_id):
+    return db.session.get(SyncState, user_id) or SyncState(user_id=user_id)
+
+
+def import_activities(user, access_token, after_date=None, before_date=None, on_page=None):
+    """Stream activities from Strava into the database page by page.
+
+    Without ``after_date`` only activities started after the user's
+    high-water mark less ``SYNC_LOOKBACK`` are requested (the current year on
+    a first sync): a watch that syncs days later, or a manual upload, adds an
+    activity older than the newest one stored. The overlap costs little, as
+    unchanged runs are not rewritten. A page identical
+    to the last one stored is skipped. ``on_page(fetched, added, updated)`` is
+    called with running totals after each page.
+
+    Returns the number of activities fetched, new runs and changed runs.
+    """
+    state = get_sync_state(user.id)
+    if after_date is None:
+        if state.last_activity_at:
+            after_date = int((make_aware(state.last_activity_at) - SYNC_LOOKBACK).timestamp())
+        else:
+            after_date = get_after_date(get_current_year())
+
+    fetched = added = updated = 0
+    newest_at, newest_hash = state.last_activity_at, state.last_page_hash
+    for page in fetch_activities(access_token, after_date, before_date):
+        fetched += len(page)
+        page_newest = max(parse_strava_date(act['start_date']) for act in page)
+        digest = page_hash(page)
+        if digest != state.last_page_hash:
+            page_added, page_updated = store_runs(user, page)
+            added += page_added
+            updated += page_updated
+        if newest_at is None or page_newest >= newest_at:
+            newest_at, newest_hash = page_newest, digest
+        if on_page:
+            on_page(fetched, added, updated)
+
+    state.last_activity_at = newest_at
+    state.last_page_hash = newest_hash
+    state.last_synced_at = datetime.utcnow()
+    db.session.add(state)
+    db.session.commit()
+    return fetched, added, updated
+
+
+def run_sync_job(job):
+    """Sync one user's activities from Strava"""
+    user = db.session.get(User, job.user_id)
+    if not user:
+        raise ValueError(f"User {job.user_id} no longer exists")
+
+    access_token = refresh_access_token(user)
+    if not access_token:
+        raise StravaFetchError("Failed to refresh access token. Please log in again.")
+
+    def on_page(fetched, added, updated):
+        report_progress(job, fetched=fetched, added=added, updated=updated)
+
+    # Runs are classified as they are stored, so only new or changed rows are touched
+    import_activities(user, access_token, job.after_date, on_page=on_page)
+
+
+def run_activity_event_job(job):
+    """Apply one webhook event: fetch and upsert the activity, or delete it once Strava no longer has it.
+
+    Events are not signed, so a delete is only applied when Strava confirms
+    the activity is gone; otherwise the current version is stored.
+    """
+    event = json.loads(job.payload)
+    user = db.session.get(User, job.user_id)
+    if not user:
+        raise ValueError(f"User {job.user_id} no longer exists")
+    activity_id = event['object_id']
+
+    access_token = refresh_access_token(user)
+    if not access_token:
+        raise StravaFetchError("Failed to refresh access token. Please log in again.")
+    res = get_client().get_activity(access_token, activity_id, max_wait=BACKGROUND_MAX_WAIT)
+    if res.status_code == 404:
+        report_progress(job, updated=delete_runs(user, [activity_id]))
+        return
+    if res.status_code != 200:
+        raise StravaFetchError(f"Strava returned {res.status_code} for activity {activity_id}: {res.text}")
+
+    activity = res.json()
+    if activity['type'] != 'Run':
+        # An update may turn a run into another sport
+        report_progress(job, fetched=1, updated=delete_runs(user, [activity_id]))
+        return
+    added, updated = store_runs(user, [activity])
+    report_progress(job, fetched=1, added=added, updated=updated)
+
+
+def handle_job(job):
+    """Dispatch a queued job to its handler; called by the background worker"""
+    if job.kind == 'activity':
+        run_activity_event_job(job)
+    else:
+        run_sync_job(job)
+
+
+def parse_strava_date(value):
+    """Naive UTC datetime from a Strava timestamp such as 2024-05-01T07:30:00Z"""
+    return parse_strava_timestamp(value).replace(tzinfo=None)
+
+
+def make_aware(dt):
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=pytz.UTC)
+    return dt
+
+
+def run_row_from_activity(user, act):
+    """Map a Strava activity dict to a Run row for bulk insertion"""
+    activity = Activity.from_strava_json(act)  # Sets club_name
+    return {
+        'user_id': user.id,
+        'strava_activity_id': str(activity.id),
+        'name': activity.name,
+        'start_date': activity.start_date,
+        'start_date_local': activity.start_date_local,
+        'distance': activity.distance,
+        'moving_time': activity.moving_time,
+        'club_name': activity.club_name,
+        **Run.columns_from_strava_json(act),
+    }
+
+
+def fetch_existing_runs(activity_ids):
+    """{activity id: (start_date_local, payload digest)} of the ids already stored, in one query per batch"""
+    existing = {}
+    for i in range(0, len(activity_ids), LOOKUP_BATCH_SIZE):
+        batch = activity_ids[i:i + LOOKUP_BATCH_SIZE]
+        existing.update(
+            (activity_id, (start_date_local, digest)) for activity_id, start_date_local, digest in
+            db.session.query(Run.strava_activity_id, Run.start_date_local, RunPayload.digest)
+            .outerjoin(RunPayload, RunPayload.strava_activity_id == Run.strava_activity_id)
+            .filter(Run.strava_activity_id.in_(batch))
+        )
+    return existing
+
+
+_upsert_statements = {}  # (table, dialect name) -> ON CONFLICT statement
+
+
+def upsert_statement(model, dialect, columns, change_columns):
+    """INSERT ... ON CONFLICT DO UPDATE for ``model``, built once per dialect.
+
+    It is executed with a list of rows as parameters, so SQLAlchemy sends
+    them as multi-row VALUES pages ("insertmanyvalues") and reuses the
+    compiled form instead of compiling a literal VALUES list per batch.
+    RETURNING reports only the rows that were inserted or rewritten. None
+    when the dialect has no ON CONFLICT.
+    """
+    key = (model.__tablename__, dialect)
+    if key not in _upsert_statements:
+        stmt = dialect_insert(model, dialect)
+        if stmt is not None:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[model.strava_activity_id],
+                set_={column: stmt.excluded[column] for column in columns},
+                where=or_(*(getattr(model, column).is_distinct_from(stmt.excluded[column])
+                            for column in change_columns))
+            ).returning(model.strava_activity_id)
+        _upsert_statements[key] = stmt
+    return _upsert_statements[key]
+
+
+def upsert_rows(model, rows, columns, change_columns):
+    """Insert or update rows keyed by strava_activity_id with a dialect-aware ON CONFLICT statement.
+
+    Existing rows are only rewritten when one of ``change_columns`` differs.
+    Returns the number of rows inserted or changed.
+    """
+    if not rows:
+        return 0
+    stmt = upsert_statement(model, db.session.get_bind().dialect.name, columns, change_columns)
+    if stmt is None:
+        for row in rows:
+            db.session.merge(model(**row))
+        return len(rows)
+    # Core execution on the session's connection: the ORM bulk path adds nothing for plain rows
+    return len(db.session.connection().execute(stmt, rows).all())
+
+
+def upsert_runs(rows):
+    """Upsert Run rows, leaving unchanged ones alone; returns the number inserted or changed"""
+    return upsert_rows(Run, rows, RUN_UPSERT_COLUMNS, RUN_UPSERT_COLUMNS)
+
+
+def upsert_payloads(rows):
+    """Upsert compressed RunPayload rows"""
+    return upsert_rows(RunPayload, rows, ('data', 'digest'), ('digest',))
+
+
+def store_runs(user, activities):
+    """Upsert the runs among activities in bulk.
+
+    Returns the number of new runs and the number of existing runs that changed.
+    """
+    # Keyed by activity id so a repeated activity only hits ON CONFLICT once
+    rows = {}
+    bodies = {}
+    for act in activities:
+        if act['type'] != 'Run':
+            continue
+        row = run_row_from_activity(user, act)
+        rows[row['strava_activity_id']] = row
+        bodies[row['strava_activity_id']] = payload_json(act)
+    if not rows:
+        return 0, 0
+
+    existing = fetch_existing_runs(list(rows))
+    written = upsert_runs(list(rows.values()))
+    # Only payloads that are new or changed are compressed and written, after the runs they reference
+    upsert_payloads([payload_row(activity_id, body) for activity_id, body in bodies.items()
+                     if existing.get(activity_id, (None, None))[1] != payload_digest(body)])
+    db.session.commit()
+    if written:
+        # Months a run moved out of need re-aggregating as well as the ones it is in now
+        refresh_run_aggregates(user.id, [row['start_date_local'] for row in rows.values()]
+                               + [start_date_local for start_date_local, _ in existing.values()])
+    added = len(rows) - len(existing)
+    return added, written - added
+
+
+def delete_runs(user, activity_ids):
+    """Delete a user's stored runs by Strava activity id; returns the number deleted"""
+    activity_ids = [str(activity_id) for activity_id in activity_ids]
+    in_batch = (Run.user_id == user.id) & Run.strava_activity_id.in_(activity_ids)
+    dates = [start for (start,) in db.session.query(Run.start_date_local).filter(in_batch)]
+    if not dates:
+        return 0
+    db.session.execute(delete(RunPayload).where(
+        RunPayload.strava_activity_id.in_(select(Run.strava_activity_id).where(in_batch))))
+    db.session.execute(delete(Run).where(in_batch))
+    db.session.commit()
+    refresh_run_aggregates(user.id, dates)
+    return len(dates)
+
+
+def refresh_run_aggregates(user_id, dates):
+    """Bring run days, stats, leaderboard and cache versions up to date after runs on these dates changed"""
+    # Stats and leaderboard read the run-day masks and daily rollups, so those go first
+    refresh_run_days(user_id, years_of(dates))
+    refresh_daily_rollups(user_id, dates)
+    refresh_user_stats(user_id)
+    clubs = refresh_leaderboard(user_id, months_of(dates))
+    bump_versions([user_scope(user_id)] + [club_scope(club) for club in clubs])
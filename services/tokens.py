@@ -0,0 +1,165 @@
+"""Strava access tokens with single-flight refresh.
+
+Strava rotates the refresh token on every refresh, so two processes
+refreshing the same user at once waste one call and may store a token that
+is already superseded. Before refreshing, a caller takes a lease on the
+user row with a conditional UPDATE (atomic on SQLite and PostgreSQL); others
+wait for the lease holder to write the new token and then use it.
+
+Lease and token writes run on their own connection and commit immediately, so
+callers never have their session committed underneath them. A background
+thread refreshes tokens ahead of expiry for users with queued or running
+jobs, so syncs rarely have to refresh on the critical path.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db
+from models.job import SyncJob
+from models.user import User
+from services.jobs import worker_id
+from services.strava import get_client
+
+REFRESH_AHEAD = timedelta(seconds=int(os.environ.get('TOKEN_REFRESH_AHEAD', '600')))
+REFRESH_INTERVAL = float(os.environ.get('TOKEN_REFRESH_INTERVAL', '60'))  # Seconds between scheduler passes
+LEASE = timedelta(seconds=120)  # Covers StravaClient's retries on a slow refresh
+LEASE_POLL = 0.2  # Seconds between checks while another process refreshes
+
+TOKEN_COLUMNS = ('access_token', 'refresh_token', 'token_expires_at')
+
+
+def lease_owner():
+    return f'{worker_id()}:{threading.get_ident()}'
+
+
+def read_tokens(user_id):
+    """Current token columns straight from the database, bypassing the session"""
+    with db.engine.connect() as connection:
+        return connection.execute(
+            select(User.access_token, User.refresh_token, User.token_expires_at).where(User.id == user_id)
+        ).one_or_none()
+
+
+def is_fresh(tokens, margin=timedelta(0)):
+    return tokens.token_expires_at is not None and datetime.utcnow() + margin < tokens.token_expires_at
+
+
+def try_lease(user_id, owner):
+    now = datetime.utcnow()
+    with db.engine.begin() as connection:
+        result = connection.execute(
+            update(User)
+            .where(User.id == user_id,
+                   or_(User.token_refresh_until.is_(None), User.token_refresh_until < now))
+            .values(token_refresh_owner=owner, token_refresh_until=now + LEASE)
+        )
+    return result.rowcount == 1
+
+
+def release_lease(user_id, owner, **tokens):
+    """Store refreshed ``tokens``, if any, and drop the lease if we still hold it"""
+    with db.engine.begin() as connection:
+        if tokens:
+            # Written even if the lease ran out: Strava has already rotated the refresh token
+            connection.execute(update(User).where(User.id == user_id).values(**tokens))
+        connection.execute(
+            update(User)
+            .where(User.id == user_id, User.token_refresh_owner == owner)
+            .values(token_refresh_owner=None, token_refresh_until=None)
+        )
+
+
+def adopt(user, tokens):
+    """Copy token columns onto the session's ``user`` without marking it dirty"""
+    for name in TOKEN_COLUMNS:
+        set_committed_value(user, name, getattr(tokens, name))
+    return user.access_token
+
+
+def refresh_with_lease(user_id, owner, margin):
+    # Someone may have finished a refresh between our read and taking the lease
+    tokens = read_tokens(user_id)
+    if is_fresh(tokens, margin):
+        release_lease(user_id, owner)
+        return tokens
+    try:
+        res = get_client().refresh_token(tokens.refresh_token)
+    except Exception:
+        release_lease(user_id, owner)
+        raise
+    if res.status_code != 200:
+        release_lease(user_id, owner)
+        return None
+    data = res.json()
+    release_lease(user_id, owner,
+                  access_token=data['access_token'],
+                  refresh_token=data['refresh_token'],
+                  token_expires_at=datetime.utcfromtimestamp(data['expires_at']))
+    return read_tokens(user_id)
+
+
+def get_access_token(user, margin=timedelta(0)):
+    """A token valid for at least ``margin``, refreshing it at most once across processes.
+
+    Returns None when the user has no refresh token, Strava rejects it, or
+    another process holds the lease for longer than it is valid.
+    """
+    owner = lease_owner()
+    deadline = time.monotonic() + LEASE.total_seconds()
+    while True:
+        tokens = read_tokens(user.id)
+        if tokens is None or not tokens.refresh_token:
+            return None
+        if is_fresh(tokens, margin):
+            return adopt(user, tokens)
+        if try_lease(user.id, owner):
+            tokens = refresh_with_lease(user.id, owner, margin)
+            return adopt(user, tokens) if tokens else None
+        if time.monotonic() > deadline:
+            return None
+        time.sleep(LEASE_POLL)
+
+
+def users_due_for_refresh(ahead=REFRESH_AHEAD):
+    """Users with pending jobs whose token expires within ``ahead``"""
+    pending = select(SyncJob.user_id).where(SyncJob.status.in_(('queued', 'running')))
+    return (
+        User.query
+        .filter(User.id.in_(pending), User.token_expires_at < datetime.utcnow() + ahead)
+        .all()
+    )
+
+
+def refresh_due_tokens(ahead=REFRESH_AHEAD):
+    """Refresh tokens that will expire soon for users with pending jobs; returns the count refreshed"""
+    refreshed = 0
+    for user in users_due_for_refresh(ahead):
+        try:
+            if get_access_token(user, margin=ahead):
+                refreshed += 1
+        except Exception as e:
+            print(f"Error refreshing token for user {user.id}: {e}")
+    return refreshed
+
+
+def refresh_loop(app, stop=None, interval=REFRESH_INTERVAL):
+    while not (stop and stop.is_set()):
+        with app.app_context():
+            try:
+                refresh_due_tokens()
+            except Exception as e:
+                print(f"Token refresh pass failed: {e}")
+            db.session.remove()
+        time.sleep(interval)
+
+
+def start_refresh_thread(app):
+    """Refresh tokens ahead of expiry in the background of this process"""
+    thread = threading.Thread(target=refresh_loop, args=(app,), name='token-refresher', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,44 @@
+"""Web pages and endpoints, one blueprint per area, registered by ``create_app``.
+
+    auth     Strava OAuth login and callback
+    runs     dashboard, stats, heatmap, exports, runner pages and sync status
+    clubs    club pages, rankings and club reprocessing
+    webhook  Strava push subscription
+    ops      /metrics and the /debug pages
+"""
+from functools import wraps
+
+from flask import redirect, session, url_for
+
+from services.clubs import get_club_matcher
+
+
+def login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not session.get('access_token'):
+            return redirect(url_for('runs.index'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def slug_to_name(slug):
+    name = get_club_matcher().names_by_slug.get(slug)
+    if name:
+        return name
+    # Clubs no longer stored may still be on runs; convert the slug back, handling special cases
+    name = slug.replace('-', ' ').title()
+
+    # Handle special club name cases
+    name_mappings = {
+        'Urc Rotterdam': 'URC Rotterdam',
+        # Add more mappings here as needed
+    }
+
+    return name_mappings.get(name, name)
+
+
+def register_blueprints(app):
+    from views import auth, clubs, ops, runs, webhook
+    for module in (auth, runs, clubs, webhook, ops):
+        app.register_blueprint(module.bp)
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+from flask import Blueprint, redirect, request, session
+
+from config import STRAVA_CLIENT_ID, STRAVA_REDIRECT_URI
+from models import db
+from models.user import User
+from services.cache import bump_versions
+from services.jobs import enqueue_sync
+from services.strava import STRAVA_URL, get_client
+
+bp = Blueprint('auth', __name__)
+
+
+@bp.route('/login')
+def login():
+    return redirect(
+        f"{STRAVA_URL}/oauth/authorize?client_id={STRAVA_CLIENT_ID}"
+        f"&response_type=code&redirect_uri={STRAVA_REDIRECT_URI}"
+        f"&approval_prompt=auto&scope=activity:read"
+    )
+
+
+@bp.route('/callback')
+def callback():
+    try:
+        code = request.args.get('code')
+        if not code:
+            return "No code provided", 400
+
+        token_res = get_client().exchange_code(code)
+        if token_res.status_code != 200:
+            return f"Token exchange failed: {token_res.text}", 400
+
+        data = token_res.json()
+        access_token = data['access_token']
+        refresh_token = data['refresh_token']
+        expires_at = datetime.utcfromtimestamp(data['expires_at'])
+
+        # Fetch user profile from Strava
+        profile_res = get_client().get_athlete(access_token)
+        if profile_res.status_code != 200:
+            return f"Failed to fetch user profile: {profile_res.text}", 400
+
+        profile = profile_res.json()
+        strava_id = str(profile['id'])
+        name = profile.get('firstname', '') + ' ' + profile.get('lastname', '')
+        profile_photo = profile.get('profile', '')  # Strava's profile photo URL
+
+        user = User.query.filter_by(strava_id=strava_id).first()
+        if not user:
+            user = User(
+                strava_id=strava_id,
+                name=name,
+                profile_photo=profile_photo,  # Save photo
+                access_token=access_token,
+                refresh_token=refresh_token,
+                token_expires_at=expires_at
+            )
+            db.session.add(user)
+        else:
+            user.name = name
+            user.profile_photo = profile_photo  # Update photo
+            user.access_token = access_token
+            user.refresh_token = refresh_token
+            user.token_expires_at = expires_at
+        db.session.commit()
+        bump_versions(['users'])  # Names and photos appear on club leaderboards
+
+        session['access_token'] = access_token
+        session['user_id'] = user.id
+
+        # Import new activities in the background; the dashboard polls /sync-status
+        enqueue_sync(user.id)
+
+        return redirect('/')
+
+    except Exception as e:
+        return f"Callback error: {str(e)}", 500
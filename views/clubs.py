@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, render_template, request, session
+
+from models.run import Run
+from services import export, reprocess
+from services.buckets import bucket_runs, month_ranges
+from services.cache import cached_response, club_scope, user_scope
+from services.clubs import get_club_matcher
+from services.leaderboard import club_leaderboard
+from services.sync import get_current_year
+from views import login_required, slug_to_name
+from views.runs import export_response
+
+bp = Blueprint('clubs', __name__)
+
+
+def group_runs_by_month(runs):
+    """Group runs by month"""
+    dated_runs = sorted((run for run in runs if run.start_date), key=lambda r: r.start_date)
+    if not dated_runs:
+        return []
+    ranges = month_ranges(dated_runs[0].start_date.year, dated_runs[-1].start_date.year)
+    return [
+        {'month': month_range['month'], 'runs': month_runs}
+        for month_range, month_runs in bucket_runs(dated_runs, ranges)
+    ]
+
+
+def get_unique_clubs(runs):
+    """Unique club names from runs"""
+    return sorted(set(run.club_name for run in runs if run.club_name))
+
+
+def club_descriptions_for(names):
+    """{club name: description} for the stored clubs among names"""
+    configs = get_club_matcher().configs
+    return {name: configs[name]['description'] for name in names if configs.get(name, {}).get('description')}
+
+
+def parse_date_arg(name, default):
+    value = request.args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d') if value else default
+
+
+@bp.app_template_filter('datetime')
+def format_datetime(value, fmt='%B %Y'):
+    return datetime.strptime(value, '%Y-%m').strftime(fmt)
+
+
+@bp.route('/club/<club_slug>')
+@login_required
+@cached_response(lambda club_slug: [user_scope(session.get('user_id')), club_scope(slug_to_name(club_slug))])
+def club_runs(club_slug):
+    club_name = slug_to_name(club_slug)
+    user_id = session.get('user_id')
+    if not user_id:
+        return render_template('index.html', authorized=False)
+    runs = Run.query.filter_by(user_id=user_id, club_name=club_name).order_by(Run.start_date).all()
+    if not runs:
+        return f"No runs found for club: {club_name}", 404
+    monthly_runs = group_runs_by_month(runs)
+
+    club_description = get_club_matcher().configs.get(club_name, {}).get('description')
+
+    return render_template(
+        'club.html',
+        authorized=True,
+        monthly_runs=monthly_runs,
+        current_year=get_current_year(),
+        club_name=club_name,
+        club_slug=club_slug,
+        club_description=club_description
+    )
+
+
+@bp.route('/my-clubs')
+@login_required
+def clubs():
+    user_id = session.get('user_id')
+    if not user_id:
+        return render_template('my-clubs.html', authorized=False, my_clubs=[], club_descriptions={})
+    runs = Run.query.filter_by(user_id=user_id).all()
+    my_clubs = get_unique_clubs(runs)
+
+    club_descriptions = club_descriptions_for(my_clubs)
+
+    return render_template(
+        'my-clubs.html',
+        authorized=True,
+        my_clubs=my_clubs,
+        club_descriptions=club_descriptions
+    )
+
+
+@bp.route('/my-ranks')
+@login_required
+def ranks():
+    user_id = session.get('user_id')
+    if not user_id:
+        return render_template('my-ranks.html', authorized=False, my_clubs=[], club_descriptions={})
+    runs = Run.query.filter_by(user_id=user_id).all()
+    my_clubs = get_unique_clubs(runs)
+
+    club_descriptions = club_descriptions_for(my_clubs)
+
+    return render_template(
+        'my-ranks.html',
+        authorized=True,
+        my_clubs=my_clubs,
+        club_descriptions=club_descriptions
+    )
+
+
+@bp.route('/club/<club_slug>/runs.<fmt>')
+@login_required
+def export_club_runs(club_slug, fmt):
+    """Every member's runs for a club between ?from= and ?to= (inclusive, YYYY-MM-DD; default this year)"""
+    year = get_current_year()
+    try:
+        start = parse_date_arg('from', datetime(year, 1, 1))
+        end = parse_date_arg('to', datetime(year, 12, 31)) + timedelta(days=1)
+    except ValueError:
+        return "Dates must be YYYY-MM-DD", 400
+    statement = export.club_runs(slug_to_name(club_slug), start, end)
+    return export_response(statement, fmt, f"{club_slug}-{start:%Y%m%d}-{end - timedelta(days=1):%Y%m%d}")
+
+
+@bp.route('/<club_slug>/rank')
+@login_required
+@cached_response(lambda club_slug: [club_scope(slug_to_name(club_slug)), 'users'])
+def club_rank(club_slug):
+    club_name = slug_to_name(club_slug)
+    # Monthly totals are materialized per runner, ranked by run days, then km
+    rank_data_grouped = []
+    for entry, user in club_leaderboard(club_name, get_current_year()):
+        if not rank_data_grouped or rank_data_grouped[-1]['month'] != entry.month:
+            rank_data_grouped.append({'month': entry.month, 'rows': []})
+        total_km = entry.distance / 1000
+        rank_data_grouped[-1]['rows'].append({
+            'runner': user,
+            'total_runs': entry.total_runs,
+            'total_run_days': entry.run_days,
+            'total_km': total_km,
+            'total_time': entry.moving_time,
+            'avg_pace': (entry.moving_time / 60) / total_km if total_km > 0 else 0,
+        })
+
+    club_config = get_club_matcher().configs.get(club_name, {})
+
+    return render_template(
+        'club-rank.html',
+        club_name=club_name,
+        rank_data=rank_data_grouped,
+        club_config=club_config
+    )
+
+
+@bp.route('/reprocess-clubs')
+@login_required
+def reprocess_clubs():
+    """Re-run club detection on all existing runs"""
+    try:
+        progress = reprocess.reprocess_clubs(user_id=session.get('user_id'))
+        return f"Reprocessed {progress.checked} runs. Updated {progress.changed} club assignments. <br><a href='/debug'>Check debug</a> | <a href='/'>Go home</a>"
+
+    except Exception as e:
+        return f"Error reprocessing clubs: {str(e)}", 500
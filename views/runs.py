@@ -0,0 +1,197 @@
+from datetime import timedelta
+
+from flask import Blueprint, Response, jsonify, redirect, render_template, request, session, stream_with_context, url_for
+
+from models import db
+from models.run import Run
+from models.user import User
+from services import export
+from services.buckets import bucket_runs, week_ranges
+from services.cache import cached_response, user_scope
+from services.jobs import enqueue_sync, latest_job
+from services.rollups import rolling_totals, year_over_year
+from services.rundays import RunDays
+from services.stats import get_user_stats
+from services.sync import STRAVA_FIRST_YEAR, get_after_date, get_current_year
+from views import login_required, slug_to_name
+
+bp = Blueprint('runs', __name__)
+
+
+def group_runs_by_week(runs, week_ranges):
+    """Group runs by week"""
+    return [
+        {
+            'week_num': week_range['week_num'],
+            'start_date': week_range['start'],
+            'end_date': week_range['end'],
+            'runs': week_runs
+        }
+        for week_range, week_runs in bucket_runs(runs, week_ranges)
+    ]
+
+
+def export_response(statement, fmt, filename):
+    """Stream the statement's rows as a CSV or NDJSON download"""
+    if fmt not in export.FORMATS:
+        return f"Unknown export format: {fmt}", 404
+    return Response(
+        stream_with_context(export.stream(statement, fmt)),
+        mimetype=export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+
+@bp.route('/')
+def index():
+    access_token = session.get('access_token')
+    user_id = session.get('user_id')
+    if not access_token or not user_id:
+        return render_template('index.html', authorized=False)
+    return dashboard(user_id=user_id)
+
+
+@cached_response(lambda user_id: [user_scope(user_id)])
+def dashboard(user_id):
+    user = User.query.get(user_id)
+    # Current season by default; ?from=<year> shows every season since then
+    current_year = get_current_year()
+    from_year = request.args.get('from', type=int) or current_year
+    from_year = max(STRAVA_FIRST_YEAR, min(from_year, current_year))
+    ranges = week_ranges(from_year, current_year)
+    runs = (
+        Run.query
+        .filter(Run.user_id == user.id,
+                Run.start_date >= ranges[0]['start'].replace(tzinfo=None),
+                Run.start_date < ranges[-1]['end'].replace(tzinfo=None))
+        .order_by(Run.start_date)
+        .all()
+    )
+    weekly_runs = group_runs_by_week(runs, ranges)
+    my_clubs = [
+        club for (club,) in
+        db.session.query(Run.club_name).filter(Run.user_id == user.id, Run.club_name.isnot(None))
+        .distinct().order_by(Run.club_name)
+    ]
+    return render_template(
+        'index.html',
+        authorized=True,
+        weekly_runs=weekly_runs,
+        current_year=current_year,
+        from_year=from_year,
+        my_clubs=my_clubs,
+        sync_job=latest_job(user.id),
+        timedelta=timedelta
+    )
+
+
+@bp.route('/stats')
+@login_required
+@cached_response(lambda: [user_scope(session.get('user_id'))])
+def stats():
+    user_id = session.get('user_id')
+    if not user_id:
+        return render_template('stats.html', authorized=False)
+
+    # Aggregates are maintained by store_runs, so this is a single-row read
+    user_stats = get_user_stats(user_id)
+
+    if not user_stats.total_runs:
+        return render_template('stats.html', authorized=True, stats=None)
+
+    # Streaks up to today come from the run-day index, a single-row-per-year read
+    days = RunDays.load(user_id)
+    longest_weekly, current_weekly = days.weekly_streaks()
+    stats = {
+        'total_runs': user_stats.total_runs,
+        'total_days_running': user_stats.total_days_running,
+        'total_kilometers': round(user_stats.total_distance / 1000, 1),
+        'total_hours': round(user_stats.total_moving_time / 3600, 1),
+        'longest_distance': round(user_stats.longest_distance / 1000, 1),
+        'longest_run_name': user_stats.longest_run_name,
+        'longest_streak': user_stats.longest_streak,
+        'current_streak': days.current_streak(),
+        'longest_weekly_streak': longest_weekly,
+        'current_weekly_streak': current_weekly,
+        'current_year': user_stats.year,
+        'current_year_runs': user_stats.year_runs,
+        'current_year_kilometers': round(user_stats.year_distance / 1000, 1),
+        'current_year_hours': round(user_stats.year_moving_time / 3600, 1),
+        'rolling': [
+            {'days': days_back, 'runs': totals.runs, 'kilometers': round(totals.distance / 1000, 1)}
+            for days_back, totals in rolling_totals(user_id).items()
+        ],
+        'year_over_year': [
+            {'year': year, 'runs': full.runs, 'kilometers': round(full.distance / 1000, 1),
+             'to_date_kilometers': round(to_date.distance / 1000, 1)}
+            for year, full, to_date in year_over_year(user_id)
+        ],
+    }
+
+    return render_template('stats.html', authorized=True, stats=stats)
+
+
+@bp.route('/heatmap.json')
+@login_required
+@cached_response(lambda: [user_scope(session.get('user_id'))])
+def heatmap():
+    """Days run in a year for the calendar heatmap; ?club=<slug> limits it to club runs"""
+    year = request.args.get('year', type=int) or get_current_year()
+    club_slug = request.args.get('club')
+    club_name = slug_to_name(club_slug) if club_slug else ''
+    days = RunDays.load(session.get('user_id'), club_name)
+    dates = days.heatmap(year)
+    return jsonify({'year': year, 'club': club_name or None, 'days_run': len(dates), 'dates': dates})
+
+
+@bp.route('/export/runs.<fmt>')
+@login_required
+def export_runs(fmt):
+    """All of the user's runs as CSV or NDJSON"""
+    return export_response(export.user_runs(session.get('user_id')), fmt, 'runs')
+
+
+@bp.route('/runner/<strava_id>')
+@login_required
+def runner_profile(strava_id):
+    """Display runner profile page"""
+    runner = User.query.filter_by(strava_id=strava_id).first()
+    if not runner:
+        return "Runner not found", 404
+
+    return render_template(
+        'runner.html',
+        runner=runner
+    )
+
+
+@bp.route('/refresh-data')
+@login_required
+def refresh_data():
+    """Queue a refresh of all data from Strava; the dashboard shows its progress"""
+    user_id = session.get('user_id')
+    if not User.query.get(user_id):
+        return "User not found.", 400
+
+    # New activities by default; ?since=<year> backfills, ?since=all imports the whole history
+    since = request.args.get('since')
+    if since == 'all':
+        after_date = 0
+    elif since:
+        year = request.args.get('since', type=int)
+        if year is None:
+            return "since must be a year or 'all'", 400
+        after_date = get_after_date(max(STRAVA_FIRST_YEAR, min(year, get_current_year())))
+    else:
+        after_date = None
+
+    enqueue_sync(user_id, after_date)
+    return redirect(url_for('.index'))
+
+
+@bp.route('/sync-status')
+@login_required
+def sync_status():
+    """Progress of the user's most recent sync, polled by the dashboard"""
+    job = latest_job(session.get('user_id'))
+    return jsonify(job.to_dict() if job else {'status': 'none'})
@@ -0,0 +1,31 @@
+from flask import Blueprint, jsonify, request
+
+from config import STRAVA_WEBHOOK_SUBSCRIPTION_ID, STRAVA_WEBHOOK_VERIFY_TOKEN
+from models.user import User
+from services.jobs import enqueue_activity_event
+
+bp = Blueprint('webhook', __name__)
+
+
+@bp.route('/webhook', methods=['GET'])
+def webhook_validate():
+    """Echo the challenge when Strava validates the push subscription"""
+    if (request.args.get('hub.mode') != 'subscribe'
+            or request.args.get('hub.verify_token') != STRAVA_WEBHOOK_VERIFY_TOKEN):
+        return "Invalid verification request", 403
+    return jsonify({'hub.challenge': request.args.get('hub.challenge')})
+
+
+@bp.route('/webhook', methods=['POST'])
+def webhook_event():
+    """Queue activity create/update/delete events; Strava expects a reply within two seconds"""
+    event = request.get_json(silent=True) or {}
+    # Nothing is accepted until STRAVA_WEBHOOK_SUBSCRIPTION_ID names our subscription
+    if not STRAVA_WEBHOOK_SUBSCRIPTION_ID or str(event.get('subscription_id')) != STRAVA_WEBHOOK_SUBSCRIPTION_ID:
+        return "Unknown subscription", 403
+    if event.get('object_type') != 'activity' or event.get('aspect_type') not in ('create', 'update', 'delete'):
+        return "", 200
+    user = User.query.filter_by(strava_id=str(event.get('owner_id'))).first()
+    if user:
+        enqueue_activity_event(user.id, event)
+    return "", 200
@@ -0,0 +1,39 @@
+"""Background worker that runs queued Strava syncs and webhook events.
+
+    python worker.py [--processes N] [--once]
+"""
+import argparse
+import multiprocessing
+
+
+def run(once=False):
+    from app import create_app
+    from services.jobs import work
+    from services.sync import handle_job
+    from services.tokens import start_refresh_thread
+    app = create_app()
+    if not once:
+        start_refresh_thread(app)
+    work(app, handle_job, once=once)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run queued Strava sync jobs and webhook events.')
+    parser.add_argument('--processes', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--once', action='store_true', help='exit once the queue is empty')
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        run(args.once)
+        return
+    # Spawn rather than fork so each process opens its own database connections
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run, args=(args.once,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()